@@ -0,0 +1,71 @@
+import argparse
+import asyncio
+import importlib
+import time
+
+import cv2
+
+from bot.indexer import GAME_COGS
+from bot.resources.fnc.fncconstants import DEFAULT_BARCLIP
+from bot.resources.fnc.fncencode import encode
+from bot.resources.fnc.fncrender import RenderService, wrap_columns
+from bot.resources.models.enums import ClipEncoding
+
+
+async def get_sample_clips(game: str, charts: int) -> list:
+    # Crops the default bar clip, and the whole chart, out of charts that have already been indexed, laid out the
+    # way the game's strategy would lay them out.
+    render_service = RenderService(max_workers=1)
+    try:
+        strategy = importlib.import_module(GAME_COGS[game]).create_strategy(render_service)
+        bar_start, bar_end = await strategy.get_barclip(DEFAULT_BARCLIP)
+        clips = []
+        for chart_filename, image_path, measures in (await strategy.get_cached_charts())[:charts]:
+            img = cv2.imread(image_path)
+            spacing_px = strategy.get_geometry(strategy.chart_filename_uses_doubles(chart_filename)).spacing_px
+            start_column, end_column = await strategy.get_columns_from_barclip(measures, bar_start, bar_end)
+            for name, crop in [(DEFAULT_BARCLIP, img[:, spacing_px * start_column:spacing_px * end_column]),
+                               ("full", img)]:
+                if strategy.clip_options.columns_per_row is not None:
+                    crop = wrap_columns(crop, spacing_px, strategy.clip_options.columns_per_row)
+                clips.append((f"{chart_filename} ({name})", crop))
+        return clips
+    finally:
+        render_service.shutdown()
+
+
+def run_benchmark(clips: list, repeats: int):
+    print(f"{'Clip':<48} {'Encoding':<14} {'KB':>9} {'ms':>9}")
+    totals = {encoding: [0, 0.0] for encoding in ClipEncoding}
+    for clip_name, crop in clips:
+        for encoding in ClipEncoding:
+            started = time.perf_counter()
+            for _ in range(repeats):
+                data = encode(crop, encoding)
+            elapsed = (time.perf_counter() - started) / repeats
+            totals[encoding][0] += len(data)
+            totals[encoding][1] += elapsed
+            print(f"{clip_name[:48]:<48} {encoding.name:<14} {len(data) / 1024:>9.1f} {elapsed * 1000:>9.1f}")
+    print(f"\nTotals over {len(clips)} clips:")
+    for encoding, (size, elapsed) in totals.items():
+        print(f"{encoding.name:<14} {size / 1024:>11.1f} KB {elapsed * 1000:>9.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compares how big, and how slow to encode, each clip encoding is "
+                                                 "on charts that have already been indexed. Index some charts with "
+                                                 "bot.indexer first.")
+    parser.add_argument("game", choices=GAME_COGS.keys())
+    parser.add_argument("--charts", type=int, default=5, help="The number of charts to sample.")
+    parser.add_argument("--repeats", type=int, default=3, help="How many times each clip is encoded, to smooth out "
+                                                               "the timings.")
+    args = parser.parse_args()
+    clips = asyncio.run(get_sample_clips(args.game, args.charts))
+    if not clips:
+        print(f"No indexed {args.game} charts with images were found.")
+        return
+    run_benchmark(clips, args.repeats)
+
+
+if __name__ == '__main__':
+    main()
@@ -13,14 +13,52 @@ from bot.exts.cogs.messagedetection import MessageDetectionCog
 from bot.exts.cogs.sdvxplus import SdvxPlusCog
 from bot.exts.cogs.sdvxindex import SdvxindexCog
 from bot.exts.cogs.threeicecream import ThreeIceCreamCog
+from bot.resources.fnc.fncrender import RenderService
 from bot.utils.detectionutils import check_message_for_matches
+from bot.utils.httputils import HttpClient
+from bot.utils.metricsutils import log_metrics
+
+
+class CbsBot(commands.Bot):
+    def __init__(self, *args, **kwargs):
+        """
+        The bot, along with the render workers and HTTP client its cogs share. Those are only made once the bot
+        starts (see setup_hook()), not when this module is imported - the render workers are spawned, so they import
+        it too, and would otherwise each make a pool of their own.
+        """
+        super().__init__(*args, **kwargs)
+        self.render_service: RenderService | None = None
+        self.http_client: HttpClient | None = None
+
+    async def setup_hook(self):
+        # Chart OCR/cropping worker processes, shared by every chart cog
+        self.render_service = RenderService()
+        self.render_service.start_health_checks()
+        # Pooled HTTP connections for every upstream fetch, shared by every cog
+        self.http_client = HttpClient()
+
+        await self.add_cog(AnimalsCog(self, self.http_client))
+        await self.add_cog(AdministrativeCog(self))
+        await self.add_cog(MessageDetectionCog(self))
+        await self.add_cog(SdvxindexCog(self, self.render_service, self.http_client))
+        await self.add_cog(SdvxPlusCog(self, self.render_service, self.http_client))
+        await self.add_cog(ThreeIceCreamCog(self, self.render_service, self.http_client))
+
+    async def close(self):
+        await super().close()
+        # The metrics only live in memory, so they're logged before they're gone.
+        log_metrics()
+        if self.http_client is not None:
+            await self.http_client.close()
+        if self.render_service is not None:
+            self.render_service.shutdown()
 
 
 # Discord bot related junk
 INTENTS = discord.Intents.default()
 INTENTS.messages = True
 INTENTS.message_content = True
-DISCORD_CLIENT = commands.Bot(command_prefix="$cbs ", intents=INTENTS)
+DISCORD_CLIENT = CbsBot(command_prefix="$cbs ", intents=INTENTS)
 
 
 @DISCORD_CLIENT.event
@@ -66,11 +104,5 @@ async def on_guild_join(guild: discord.Guild):
 
 async def main():
     load_dotenv()
-    await DISCORD_CLIENT.add_cog(AnimalsCog(DISCORD_CLIENT))
-    await DISCORD_CLIENT.add_cog(AdministrativeCog(DISCORD_CLIENT))
-    await DISCORD_CLIENT.add_cog(MessageDetectionCog(DISCORD_CLIENT))
-    await DISCORD_CLIENT.add_cog(SdvxindexCog(DISCORD_CLIENT))
-    await DISCORD_CLIENT.add_cog(SdvxPlusCog(DISCORD_CLIENT))
-    await DISCORD_CLIENT.add_cog(ThreeIceCreamCog(DISCORD_CLIENT))
     DISCORD_CLIENT.run(os.getenv('TOKEN'))
 
@@ -1,7 +1,9 @@
+import io
 import logging
 import discord
 from discord.ext import commands
 from bot.exts.database import set_bot_messages_ability
+from bot.utils.metricsutils import format_metrics
 
 
 async def is_owner_or_admin(ctx) -> bool:
@@ -54,6 +56,13 @@ class AdministrativeCog(commands.Cog):
                 logging.warning(f"Message creator was not the bot, not deleting.")
                 await ctx.send(f"Did not delete message {ctx.message.id}, was a user message.", ephemeral=True)
 
+    @commands.hybrid_command(name="metrics", description="(Owner/Admin only) Shows the bot's performance metrics.")
+    async def metrics(self, ctx) -> None:
+        if await is_owner_or_admin(ctx):
+            # Sent as a file, since there are far more metrics than fit in a 2000 character message.
+            metrics_file = discord.File(io.BytesIO(format_metrics().encode()), filename="metrics.txt")
+            await ctx.send("Current metrics:", file=metrics_file, ephemeral=True)
+
 
 
 def setup(bot):
@@ -1,16 +1,18 @@
 import discord
 import logging
+import msgspec
 import random
-import requests
 import numpy as np
 from discord.ext import commands
 from typing import get_args
 from bot.resources.models.animals import ANIMAL_LITERAL, RATING_MAPPINGS
+from bot.utils.httputils import HttpClient
 
 
-def get_random_animal_image(animal: str) -> str:
-    response = requests.get("https://api.tinyfox.dev/img.json", {'animal': animal})
-    return "https://api.tinyfox.dev" + response.json().get("loc")
+async def get_random_animal_image(http_client: HttpClient, animal: str) -> str:
+    response = await http_client.get("https://api.tinyfox.dev/img.json", params={'animal': animal},
+                                      hedge=True)
+    return "https://api.tinyfox.dev" + msgspec.json.decode(response.content).get("loc")
 
 
 def n(rating: str) -> str:
@@ -37,26 +39,27 @@ def get_rating() -> str:
 
 
 class AnimalsCog(commands.Cog):
-    def __init__(self, bot):
+    def __init__(self, bot, http_client: HttpClient):
         self.bot = bot
+        self.http_client = http_client
         self._last_member = None
 
     @commands.hybrid_command(name="possum", description="Get a random possum image. 1 times/user/day.")
     @commands.cooldown(1, 86400, commands.BucketType.member)
     async def possum(self, ctx) -> None:
-        await ctx.send(get_random_animal_image("poss"))
+        await ctx.send(await get_random_animal_image(self.http_client, "poss"))
 
     @commands.hybrid_command(name="randomanimal", description="Get a random animal image. 1 time/user/day.")
     @commands.cooldown(1, 86400, commands.BucketType.member)
     async def random_animal(self, ctx, animal: ANIMAL_LITERAL) -> None:
-        await ctx.send(get_random_animal_image(animal))
+        await ctx.send(await get_random_animal_image(self.http_client, animal))
 
     @commands.hybrid_command(name="truerandomanimal", description="Get a COMPLETELY random animal image. "
                                                                   "1 time/user/day.")
     @commands.cooldown(1, 86400, commands.BucketType.member)
     async def true_random_animal(self, ctx) -> None:
         random_animal = random.choice(get_args(ANIMAL_LITERAL))
-        url = get_random_animal_image(random_animal)
+        url = await get_random_animal_image(self.http_client, random_animal)
         await ctx.send(embed=create_animal_embed(url))
 
     @random_animal.error
@@ -70,4 +73,4 @@ class AnimalsCog(commands.Cog):
 
 def setup(bot):
     logging.warning("Animals cog added.")
-    bot.add_cog(AnimalsCog(bot))
+    bot.add_cog(AnimalsCog(bot, HttpClient()))
@@ -7,23 +7,39 @@ from discord import app_commands
 from discord.ext import commands
 
 from bot.resources.fnc.sdvx.main.sdvxfncstrategy import SdvxFncStrategy
+from bot.resources.fnc.fncrender import RenderService
+from bot.resources.fnc.fncconstants import CLIP_TARGET_BYTES
+from bot.resources.models.enums import OcrBackend, ClipEncoding
+from bot.utils.httputils import HttpClient
+
+
+def create_strategy(render_service: RenderService, http_client: HttpClient | None = None) -> SdvxFncStrategy:
+    # Creates the strategy with the measure number locations for this site's chart images.
+    return SdvxFncStrategy(x1_left_px=42,
+                           x2_left_px=90,
+                           y1_bottom_px=35,
+                           y2_bottom_px=0,
+                           spacing_px=254,
+                           doubles_spacing_px=None,
+                           bottom_cutoff_px=11,
+                           ocr_scale_multiplier=3,
+                           ocr_min_scale_multiplier=1,
+                           measure_oob_tol=20,
+                           game_title="sdvx",
+                           ocr_backend=OcrBackend.TEMPLATE,
+                           render_service=render_service,
+                           http_client=http_client,
+                           max_columns_per_row=8,
+                           clip_encodings=[ClipEncoding.PNG, ClipEncoding.WEBP_LOSSLESS],
+                           clip_max_bytes=CLIP_TARGET_BYTES)
 
 
 class SdvxindexCog(commands.Cog):
 
-    def __init__(self, bot):
+    def __init__(self, bot, render_service: RenderService, http_client: HttpClient):
         self.bot = bot
         self._last_member = None
-        self.strategy = SdvxFncStrategy(x1_left_px=42,
-                                        x2_left_px=90,
-                                        y1_bottom_px=35,
-                                        y2_bottom_px=0,
-                                        spacing_px=254,
-                                        doubles_spacing_px=None,
-                                        bottom_cutoff_px=11,
-                                        ocr_scale_multiplier=2,
-                                        measure_oob_tol=20,
-                                        game_title="sdvx")
+        self.strategy = create_strategy(render_service, http_client)
 
     async def song_autocomplete(self, interaction: discord.Interaction, current: str) \
             -> List[discord.app_commands.Choice[str]]:
@@ -58,4 +74,4 @@ class SdvxindexCog(commands.Cog):
 
 def setup(bot):
     logging.warning("Sdvxindex cog added.")
-    bot.add_cog(SdvxindexCog(bot))
+    bot.add_cog(SdvxindexCog(bot, RenderService(), HttpClient()))
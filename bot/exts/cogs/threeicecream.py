@@ -7,23 +7,41 @@ from discord import app_commands
 from discord.ext import commands
 
 from bot.resources.fnc.ddr.threeicecreamstrategy import ThreeIceCreamStrategy
+from bot.resources.fnc.fncrender import RenderService
+from bot.resources.fnc.fncconstants import CLIP_TARGET_BYTES
+from bot.resources.models.enums import OcrBackend, ClipEncoding
+from bot.utils.httputils import HttpClient
+
+
+def create_strategy(render_service: RenderService, http_client: HttpClient | None = None) -> ThreeIceCreamStrategy:
+    # Creates the strategy with the measure number locations for this site's chart images.
+    return ThreeIceCreamStrategy(x1_left_px=0,
+                                 x2_left_px=19,
+                                 y1_bottom_px=915,
+                                 y2_bottom_px=889,
+                                 spacing_px=160,
+                                 doubles_spacing_px=288,
+                                 bottom_cutoff_px=24,
+                                 ocr_scale_multiplier=3,
+                                 ocr_min_scale_multiplier=1,
+                                 measure_oob_tol=5,
+                                 game_title="ddr",
+                                 ocr_backend=OcrBackend.TEMPLATE,
+                                 render_service=render_service,
+                                 http_client=http_client,
+                                 column_tiles=True,
+                                 max_columns_per_row=16,
+                                 clip_encodings=[ClipEncoding.PNG, ClipEncoding.PNG_INDEXED,
+                                                 ClipEncoding.WEBP_LOSSLESS],
+                                 clip_max_bytes=CLIP_TARGET_BYTES)
 
 
 class ThreeIceCreamCog(commands.Cog):
 
-    def __init__(self, bot):
+    def __init__(self, bot, render_service: RenderService, http_client: HttpClient):
         self.bot = bot
         self._last_member = None
-        self.strategy = ThreeIceCreamStrategy(x1_left_px=0,
-                                              x2_left_px=19,
-                                              y1_bottom_px=915,
-                                              y2_bottom_px=889,
-                                              spacing_px=160,
-                                              doubles_spacing_px=288,
-                                              bottom_cutoff_px=24,
-                                              ocr_scale_multiplier=2,
-                                              measure_oob_tol=5,
-                                              game_title="ddr")
+        self.strategy = create_strategy(render_service, http_client)
 
     async def song_autocomplete(self, interaction: discord.Interaction, current: str) \
             -> List[discord.app_commands.Choice[str]]:
@@ -63,4 +81,4 @@ class ThreeIceCreamCog(commands.Cog):
 
 def setup(bot):
     logging.warning("3icecream cog added.")
-    bot.add_cog(ThreeIceCreamCog(bot))
+    bot.add_cog(ThreeIceCreamCog(bot, RenderService(), HttpClient()))
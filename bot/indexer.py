@@ -0,0 +1,157 @@
+import argparse
+import asyncio
+import importlib
+import logging
+import os
+import time
+
+from bot.resources.fnc.fncimage import SharedImage, release_image
+from bot.resources.fnc.fncrender import RenderService
+from bot.resources.fnc.fncstrategy import ChartUnavailableError
+from bot.resources.models.enums import OcrBackend
+from bot.utils.fileutils import read_file
+from bot.utils.httputils import HttpClient
+
+# The cog module that creates the strategy for each game. Only the one being indexed gets imported.
+GAME_COGS = {"ddr": "bot.exts.cogs.threeicecream",
+             "sdvx": "bot.exts.cogs.sdvxindex",
+             "sdvxplus": "bot.exts.cogs.sdvxplus"}
+
+
+async def get_chart_image(strategy, song, difficulty, images_folder: str | None) -> SharedImage | None:
+    # Uses an already downloaded image from the images folder if one was given, otherwise gets the image the same
+    # way a chart command would. The image is decoded, and has to be given to release_image() once it's done with.
+    if images_folder is None:
+        try:
+            return await strategy.get_decoded_image(song=song, difficulty=difficulty)
+        except ChartUnavailableError as e:
+            logging.warning(f"Skipped a chart the site doesn't have. {e}")
+            return None
+    chart_filename = await strategy.map_chart_filename(song=song, difficulty=difficulty)
+    path = next((path for path in (f"{images_folder}/{chart_filename}", f"{images_folder}/{chart_filename}.png")
+                 if os.path.isfile(path)), None)
+    return await strategy.decode_image(read_file(path)) if path is not None else None
+
+
+async def index_chart(strategy, song, difficulty, images_folder: str | None) -> bool:
+    # Reads and saves the measures of a single chart, the same way a chart command would. Returns False if there
+    # was no image for the chart.
+    image = await get_chart_image(strategy, song, difficulty, images_folder)
+    if image is None:
+        return False
+    use_doubles = await strategy.use_doubles_spacing(song=song, difficulty=difficulty)
+    try:
+        measure_numbers, confidences = await strategy.get_measure_numbers_from_image(image, use_doubles)
+        if strategy.column_tiles:
+            await strategy.save_column_tiles(image, use_doubles, song=song, difficulty=difficulty)
+    finally:
+        release_image(image)
+    measure_numbers, confidences = await strategy.adjust_measures(measure_numbers, confidences)
+    await strategy.save_measure_numbers_to_file(measure_numbers, song=song, difficulty=difficulty,
+                                                confidences=confidences)
+    return True
+
+
+async def reread_chart(strategy, song, difficulty, images_folder: str | None, min_confidence: float) -> bool:
+    # Reads the columns of an already indexed chart that are below the minimum confidence again. Returns False if
+    # there was no image for the chart.
+    image = await get_chart_image(strategy, song, difficulty, images_folder)
+    if image is None:
+        return False
+    chart_filename = await strategy.map_chart_filename(song=song, difficulty=difficulty)
+    use_doubles = await strategy.use_doubles_spacing(song=song, difficulty=difficulty)
+    try:
+        measure_numbers, confidences = await strategy.reread_low_confidence_columns(
+            image, use_doubles, strategy.get_measure_index().get(chart_filename),
+            strategy.get_measure_index().get_confidences(chart_filename), min_confidence)
+    finally:
+        release_image(image)
+    await strategy.save_measure_numbers_to_file(measure_numbers, song=song, difficulty=difficulty,
+                                                confidences=confidences)
+    return True
+
+
+async def is_low_confidence(strategy, song, difficulty, min_confidence: float) -> bool:
+    # Charts indexed before confidences were kept don't have any, and are left alone.
+    chart_filename = await strategy.map_chart_filename(song=song, difficulty=difficulty)
+    confidences = strategy.get_measure_index().get_confidences(chart_filename)
+    return confidences is not None and min(confidences.values()) < min_confidence
+
+
+async def index_game(game: str, images_folder: str | None, workers: int, limit: int | None,
+                     reread_below: float | None):
+    render_service = RenderService(max_workers=workers, max_queue_depth=workers * 4)
+    http_client = HttpClient()
+    strategy = importlib.import_module(GAME_COGS[game]).create_strategy(render_service, http_client)
+
+    charts = await strategy.get_charts()
+    if reread_below is None:
+        # Anything that already has measures is skipped, so an interrupted run picks up where it left off.
+        unindexed = [(song, difficulty) for song, difficulty in charts
+                     if not await strategy.measure_file_exists(song=song, difficulty=difficulty)]
+        pending = unindexed[:limit]
+        print(f"{len(charts) - len(unindexed)} of {len(charts)} {game} charts already indexed, "
+              f"indexing {len(pending)}.")
+    else:
+        # Only charts that have already been indexed, and that have measures below the confidence, are touched.
+        low_confidence = [(song, difficulty) for song, difficulty in charts
+                          if await strategy.measure_file_exists(song=song, difficulty=difficulty)
+                          and await is_low_confidence(strategy, song, difficulty, reread_below)]
+        pending = low_confidence[:limit]
+        print(f"{len(low_confidence)} of {len(charts)} {game} charts have measures below {reread_below} "
+              f"confidence, re-reading {len(pending)}.")
+
+    # Build the digit templates up front, otherwise every chart that starts before they exist builds its own.
+    if strategy.ocr_backend == OcrBackend.TEMPLATE:
+        await strategy.get_digit_templates()
+
+    semaphore = asyncio.Semaphore(workers * 2)
+    started = time.monotonic()
+    counts = {"done": 0, "indexed": 0, "missing": 0, "failed": 0}
+
+    async def run(song, difficulty):
+        async with semaphore:
+            chart_filename = await strategy.map_chart_filename(song=song, difficulty=difficulty)
+            try:
+                if reread_below is None:
+                    found = await index_chart(strategy, song, difficulty, images_folder)
+                else:
+                    found = await reread_chart(strategy, song, difficulty, images_folder, reread_below)
+                counts["indexed" if found else "missing"] += 1
+            except Exception as e:
+                counts["failed"] += 1
+                logging.warning(f"Failed to index chart {chart_filename}. Error: {e}.")
+            counts["done"] += 1
+            print(f"[{counts['done']}/{len(pending)}] {chart_filename} - {counts['indexed']} indexed, "
+                  f"{counts['missing']} without an image, {counts['failed']} failed, "
+                  f"{counts['done'] / (time.monotonic() - started):.2f} charts/s", flush=True)
+
+    try:
+        await asyncio.gather(*(run(song, difficulty) for song, difficulty in pending))
+    finally:
+        render_service.shutdown()
+        await http_client.close()
+    print(f"Finished indexing {game} in {time.monotonic() - started:.1f}s.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reads the measure numbers of every chart in a game's catalog ahead "
+                                                 "of time, so chart commands don't have to wait on OCR. Charts that "
+                                                 "already have measures are skipped, so an interrupted run can "
+                                                 "simply be started again.")
+    parser.add_argument("game", choices=GAME_COGS.keys())
+    parser.add_argument("--images", help="A folder of already downloaded chart images, named after their chart "
+                                         "filename. Charts without an image in it are skipped, nothing is "
+                                         "downloaded.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="The number of OCR worker processes. Defaults to one per core.")
+    parser.add_argument("--limit", type=int, help="Only index this many charts.")
+    parser.add_argument("--reread-below", type=float, metavar="CONFIDENCE",
+                        help="Instead of indexing new charts, read the columns of already indexed charts whose "
+                             "measures are below this confidence (0-100) again.")
+    args = parser.parse_args()
+    asyncio.run(index_game(args.game, args.images, args.workers, args.limit, args.reread_below))
+
+
+if __name__ == '__main__':
+    main()
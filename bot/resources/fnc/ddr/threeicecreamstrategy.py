@@ -1,21 +1,27 @@
-import json
+import asyncio
 import logging
-import os
+import random
 import re
+import time
 
 import discord
 import msgspec
 import pytesseract
-import requests
 
 from discord import Embed
 from unidecode import unidecode
 
 from bot.resources.fnc.ddr.ddrfncmodels import DdrSong
 from bot.resources.fnc.ddr.songdata import DDR_SONGS
-from bot.resources.fnc.fncconstants import SONG_DATA_FOLDER, OUTPUT_FILE_NAME, DEFAULT_BARCLIP, BARCLIP_REGEX
+from bot.resources.fnc.fncconstants import SONG_DATA_FOLDER, DEFAULT_BARCLIP, BARCLIP_REGEX, CLIP_MAX_BYTES, \
+    THREEICECREAM_URL, THREEICECREAM_IMAGE_POLL_SECONDS, THREEICECREAM_IMAGE_POLL_INTERVAL, THREEICECREAM_ATTEMPTS, \
+    THREEICECREAM_RETRY_BACKOFF
 from bot.resources.fnc.fncstrategy import FncStrategy
 from bot.resources.fnc.ddr.ddrfncmodels import LEVEL_MAPPINGS, VERSION_MAPPINGS
+from bot.resources.fnc.fncimage import SharedImage
+from bot.resources.models.enums import OcrBackend
+from bot.utils import metricsutils
+from bot.utils.httputils import HttpError, HttpResponse
 
 SONG_LIST: list[DdrSong] = msgspec.json.decode(DDR_SONGS, type=list[DdrSong])
 
@@ -24,10 +30,15 @@ pytesseract.pytesseract.tesseract_cmd = r'/usr/bin/tesseract'
 
 class ThreeIceCreamStrategy(FncStrategy):
     def __init__(self, x1_left_px, x2_left_px, y1_bottom_px, y2_bottom_px, spacing_px, doubles_spacing_px,
-                 bottom_cutoff_px, ocr_scale_multiplier, measure_oob_tol, game_title):
+                 bottom_cutoff_px, ocr_scale_multiplier, measure_oob_tol, game_title,
+                 ocr_backend=OcrBackend.TESSERACT_BATCHED, render_service=None, ocr_min_scale_multiplier=None,
+                 column_tiles=False, max_columns_per_row=None, clip_encodings=None,
+                 clip_max_bytes=CLIP_MAX_BYTES, http_client=None):
         super(ThreeIceCreamStrategy, self).__init__(x1_left_px, x2_left_px, y1_bottom_px, y2_bottom_px, spacing_px,
                                                     doubles_spacing_px, bottom_cutoff_px, ocr_scale_multiplier,
-                                                    measure_oob_tol, game_title)
+                                                    measure_oob_tol, game_title, ocr_backend, render_service,
+                                                    ocr_min_scale_multiplier, column_tiles, max_columns_per_row,
+                                                    clip_encodings, clip_max_bytes, http_client)
         pass
 
     async def execute_strategy(self, ctx, **kwargs):
@@ -49,39 +60,57 @@ class ThreeIceCreamStrategy(FncStrategy):
     async def map_chart_filename(self, **kwargs) -> str:
         return f"{kwargs['song'].song_id}-{kwargs['difficulty']['name']}"
 
-    async def download_image_file(self, **kwargs) -> str:
+    async def download_image(self, **kwargs) -> HttpResponse:
         song = kwargs["song"]
         difficulty = kwargs["difficulty"]
 
         chart_url = await self.get_song_url(song=song, difficulty=difficulty)
-        filename = await self.get_local_song_id_folder_plus_filename(song=song, difficulty=difficulty) + ".png"
-        path = await self.get_local_song_id_folder(song=song)
-        file_url = f'https://3icecream.com/img/charts/{song.song_id}-{difficulty["rating_index"]}-x2.png'
-
-        if os.path.isfile(filename):
-            logging.warning(f"Cached file already found, using file {filename}.")
-            return filename
-
-        try:
-            # 3icecream is weird, the chart only lives server-side for a handful of seconds once the chart's page has
-            # been accessed. Therefore, we need to send a GET request to the page and just grab the image while it's
-            # still existent using our "usual" method.
-            logging.warning(f"Attempting to get page at {chart_url}.")
-            requests.get(chart_url)
-            logging.warning(f"Downloading image from {file_url}.")
-            image = requests.get(file_url).content
-            if not os.path.isfile(filename):
-                # Cache the file if it doesn't exist.
-                os.makedirs(path, exist_ok=True)
-                with open(filename, "wb") as handler:
-                    handler.write(image)
-            else:
-                logging.warning(f"Cached file already found, using file {filename}.")
-            logging.warning(f"Successfully downloaded image. Local path: {filename}.")
-            return filename
-        except Exception as e:
-            logging.warning(f"Error occurred getting image. Error: {e}.")
-            raise e
+        file_url = f'{THREEICECREAM_URL}/img/charts/{song.song_id}-{difficulty["rating_index"]}-x2.png'
+
+        # 3icecream is weird, the chart only lives server-side for a handful of seconds once the chart's page has
+        # been accessed, and it may take a moment to show up. Therefore, we need to send a GET request to the page
+        # and then keep trying the image for a little while. If it never shows up, the whole thing is tried again
+        # after a jittered backoff, so a burst of retries doesn't all land on the site at once.
+        response = None
+        for attempt in range(THREEICECREAM_ATTEMPTS):
+            if attempt > 0:
+                metricsutils.increment(f"{self.game_title}.page_retries")
+                await asyncio.sleep(THREEICECREAM_RETRY_BACKOFF * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+            try:
+                logging.warning(f"Attempting to get page at {chart_url}.")
+                started = time.monotonic()
+                await self.http_client.get(chart_url)
+                metricsutils.observe(f"{self.game_title}.page_warm", time.monotonic() - started)
+                logging.warning(f"Downloading image from {file_url}.")
+                response = await self.poll_image(file_url, kwargs.get("headers"))
+            except HttpError as e:
+                logging.warning(f"Error occurred getting image. Error: {e}.")
+                if attempt == THREEICECREAM_ATTEMPTS - 1:
+                    raise e
+                continue
+            if response.ok or response.status == 304:
+                logging.warning(f"Successfully downloaded image from {file_url}.")
+                return response
+        # Timing out on the image is more likely to be 3icecream being slow than the chart not existing, so it's
+        # raised like any other timeout, which only keeps the chart marked unavailable for a short while.
+        raise HttpError(f"Image never showed up at {file_url} after {THREEICECREAM_ATTEMPTS} attempts. "
+                        f"Status: {response.status}.")
+
+    async def poll_image(self, file_url: str, headers: dict | None) -> HttpResponse:
+        # Gets the image, trying again every so often while it isn't there yet, until the polling window is over.
+        started = time.monotonic()
+        while True:
+            response = await self.http_client.get(file_url, headers=headers)
+            metricsutils.increment(f"{self.game_title}.image_polls")
+            elapsed = time.monotonic() - started
+            if response.ok or response.status == 304 or elapsed >= THREEICECREAM_IMAGE_POLL_SECONDS:
+                metricsutils.observe(f"{self.game_title}.image_fetch", elapsed)
+                return response
+            await asyncio.sleep(THREEICECREAM_IMAGE_POLL_INTERVAL * random.uniform(0.5, 1.5))
+
+    async def get_local_image_path(self, **kwargs) -> str:
+        return await self.get_local_song_id_folder_plus_filename(song=kwargs["song"],
+                                                                 difficulty=kwargs["difficulty"]) + ".png"
 
     async def use_doubles_spacing(self, **kwargs):
         difficulty = kwargs["difficulty"]
@@ -92,11 +121,20 @@ class ThreeIceCreamStrategy(FncStrategy):
             logging.warning("Using Singles spacing.")
             return False
 
-    async def get_measure_numbers_from_image(self, file_path: str, use_doubles_spacing: bool) -> dict[int, int]:
-        return await super(ThreeIceCreamStrategy, self).get_measure_numbers_from_image(file_path, use_doubles_spacing)
+    async def get_measure_numbers_from_image(self, image: SharedImage,
+                                             use_doubles_spacing: bool) -> tuple[dict[int, int], dict[int, float]]:
+        return await super(ThreeIceCreamStrategy, self).get_measure_numbers_from_image(image, use_doubles_spacing)
 
-    async def adjust_measures(self, column_dict: dict[int, int]) -> dict[int, int]:
-        return await super(ThreeIceCreamStrategy, self).adjust_measures(column_dict)
+    async def get_cached_charts(self) -> list[tuple[str, str, dict[int, int]]]:
+        return await super(ThreeIceCreamStrategy, self).get_cached_charts()
+
+    def chart_filename_uses_doubles(self, chart_filename: str) -> bool:
+        # Chart filenames end with the rating name, for example "ESP" or "EDP". The middle letter is the play style.
+        return chart_filename.rsplit("-", 1)[-1][1] == "D"
+
+    async def adjust_measures(self, column_dict: dict[int, int],
+                              confidence_dict: dict[int, float]) -> tuple[dict[int, int], dict[int, float]]:
+        return await super(ThreeIceCreamStrategy, self).adjust_measures(column_dict, confidence_dict)
 
     async def get_columns_from_barclip(self, column_dict: dict[int, int], bar_start: str, bar_end: str):
         return await super(ThreeIceCreamStrategy, self).get_columns_from_barclip(column_dict, bar_start, bar_end)
@@ -129,56 +167,33 @@ class ThreeIceCreamStrategy(FncStrategy):
         pass
 
     async def get_song_url(self, **kwargs) -> str:
-        return (f"https://3icecream.com/ren/chart?songId={kwargs['song'].song_id}"
+        return (f"{THREEICECREAM_URL}/ren/chart?songId={kwargs['song'].song_id}"
                 f"&speedmod=2&diff={kwargs['difficulty']['rating_index']}")
 
-    async def crop_image(self, local_file_path: str, start_column: int, end_column: int,
-                         use_doubles_spacing: bool) -> str:
-        return await super(ThreeIceCreamStrategy, self).crop_image(local_file_path, start_column, end_column,
-                                                                   use_doubles_spacing)
+    async def crop_image(self, image: SharedImage, start_column: int, end_column: int,
+                         use_doubles_spacing: bool) -> bytes:
+        return await super(ThreeIceCreamStrategy, self).crop_image(image, start_column, end_column, use_doubles_spacing)
 
-    async def create_embed(self, cropped_image_path: str, chart_url: str, **kwargs) -> Embed:
+    async def create_embed(self, attachment_filename: str, chart_url: str, **kwargs) -> Embed:
         song = kwargs["song"]
         difficulty = kwargs["difficulty"]
 
         embed = discord.Embed(color=LEVEL_MAPPINGS[difficulty["full_name"]]["color"])
         embed.set_author(name=f'{song.song_name} ({difficulty["name"]} {difficulty["level"]})')
-        embed.set_thumbnail(url=f'https://3icecream.com/img/banners/f/{song.song_id}.jpg')
+        embed.set_thumbnail(url=f'{THREEICECREAM_URL}/img/banners/f/{song.song_id}.jpg')
         embed.add_field(name='Version First Appeared', value=f'{VERSION_MAPPINGS[song.version_num]}', inline=False)
         embed.add_field(name='3icecream URL', value=f'[link to chart]({chart_url})', inline=False)
-        embed.set_image(url=f'attachment://{OUTPUT_FILE_NAME}')
+        embed.set_image(url=f'attachment://{attachment_filename}')
         return embed
 
-    async def get_measure_file_name(self, **kwargs):
-        partial_filename = await self.map_chart_filename(song=kwargs["song"], difficulty=kwargs["difficulty"])
-        return f"measures-{partial_filename}.json"
-
     async def measure_file_exists(self, **kwargs) -> bool:
-        song = kwargs["song"]
-        difficulty = kwargs["difficulty"]
-
-        filename = await self.get_measure_file_name(song=song, difficulty=difficulty)
-        path = await self.get_local_song_id_folder(song=song)
-        return os.path.isfile(f"{path}{filename}")
+        return await super(ThreeIceCreamStrategy, self).measure_file_exists(**kwargs)
 
     async def get_measure_numbers_from_file(self, **kwargs) -> dict[int, int]:
-        song = kwargs["song"]
-
-        filename = await self.get_measure_file_name(song=song, difficulty=kwargs["difficulty"])
-        path = await self.get_local_song_id_folder(song=song)
-        with open(f"{path}{filename}") as fp:
-            data = json.load(fp)
-        return {int(key): value for key, value in data.items()}
+        return await super(ThreeIceCreamStrategy, self).get_measure_numbers_from_file(**kwargs)
 
     async def save_measure_numbers_to_file(self, measures: dict[int, int], **kwargs):
-        song = kwargs["song"]
-        difficulty = kwargs["difficulty"]
-
-        filename = await self.get_measure_file_name(song=song, difficulty=difficulty)
-        path = await self.get_local_song_id_folder(song=song)
-        os.makedirs(path, exist_ok=True)
-        with open(f"{path}{filename}", 'w') as fp:
-            json.dump(measures, fp)
+        return await super(ThreeIceCreamStrategy, self).save_measure_numbers_to_file(measures, **kwargs)
 
     async def get_local_song_id_folder_plus_filename(self, **kwargs) -> str:
         filename = await self.map_chart_filename(song=kwargs['song'], difficulty=kwargs["difficulty"])
@@ -197,6 +212,10 @@ class ThreeIceCreamStrategy(FncStrategy):
     async def get_difficulty(self, **kwargs):
         return kwargs["difficulty"]
 
+    async def get_charts(self) -> list[tuple]:
+        return [(song, difficulty) for song in SONG_LIST
+                for difficulty in (await self.map_ratings_to_dict(song.ratings)).values()]
+
     @staticmethod
     async def map_ratings_to_dict(rating_list: list[int]) -> dict[int, dict[str, str | int]]:
         new_rating_dict = dict()
@@ -0,0 +1,168 @@
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse, parse_qs
+
+import msgspec
+
+from bot.resources.fnc.fncconstants import CLIP_CACHE_FILE_NAME, CLIP_CACHE_MEMORY_BYTES, CLIP_CACHE_DISK_BYTES
+from bot.resources.fnc.fncmodels import ClipOptions
+from bot.utils.sqliteutils import connect
+
+# One connection per database per process, and how many bytes of clips each database holds. The total is worked out
+# once when the database is opened and kept up to date from then on, so putting a clip never has to add up every clip.
+CONNECTIONS = {}
+DISK_BYTES: dict[str, int] = {}
+
+
+class MemoryLru:
+    def __init__(self, max_bytes: int):
+        """
+        An in-memory LRU of encoded clips. Once the clips add up to more than max_bytes, the least recently used ones
+        are dropped. One of these is shared by every game, so the budget covers the whole bot.
+        """
+        self.max_bytes = max_bytes
+        self.entries: OrderedDict[tuple, bytes] = OrderedDict()
+        self.total_bytes = 0
+        # The clip caches are used from asyncio.to_thread(), so several threads can be in here at once.
+        self.lock = threading.RLock()
+
+    def get(self, key: tuple) -> bytes | None:
+        with self.lock:
+            data = self.entries.get(key)
+            if data is not None:
+                self.entries.move_to_end(key)
+            return data
+
+    def put(self, key: tuple, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        with self.lock:
+            self.remove(key)
+            self.entries[key] = data
+            self.total_bytes += len(data)
+            while self.total_bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.total_bytes -= len(evicted)
+
+    def remove(self, key: tuple):
+        with self.lock:
+            data = self.entries.pop(key, None)
+            if data is not None:
+                self.total_bytes -= len(data)
+
+    def remove_prefix(self, prefix: tuple):
+        # Removes every clip whose key starts with prefix.
+        with self.lock:
+            for key in [key for key in self.entries if key[:len(prefix)] == prefix]:
+                self.remove(key)
+
+
+MEMORY_TIER = MemoryLru(CLIP_CACHE_MEMORY_BYTES)
+
+
+class ClipCache:
+    def __init__(self, game_folder: str, max_disk_bytes: int = CLIP_CACHE_DISK_BYTES):
+        """
+        Finished chart clips (the encoded image that gets sent to Discord), so asking for the same bars of the same
+        chart again doesn't touch the chart image at all. Clips are kept in memory, and in a SQLite database in the
+        game folder so they survive a restart. Both tiers evict the least recently used clips once they go over
+        their byte budget.
+
+        Every method reads or writes the database, so the bot calls them with asyncio.to_thread().
+
+        Clips are keyed by chart filename, columns, doubles spacing, clip options (layout and encoding) and the
+        version of the chart's measures, so measures being read again never serve an old clip. invalidate() drops
+        every clip of a chart straight away, for when the chart image itself changes.
+
+        The Discord CDN URL a clip was uploaded to is kept under the same key, so the clip can be linked to instead
+        of being uploaded again.
+
+        game_folder - The folder the game's song folders live in, ending in a slash.
+        max_disk_bytes - How big the clips on the drive can get in total before the oldest ones are evicted.
+        """
+        self.game_folder = game_folder
+        self.max_disk_bytes = max_disk_bytes
+        db_path = f"{game_folder}{CLIP_CACHE_FILE_NAME}"
+        if db_path not in CONNECTIONS:
+            connection = connect(db_path)
+            connection.execute("CREATE TABLE IF NOT EXISTS clips (key TEXT PRIMARY KEY, chart_filename TEXT, "
+                               "size INTEGER, data BLOB, last_used REAL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS clips_chart_filename ON clips (chart_filename)")
+            connection.execute("CREATE INDEX IF NOT EXISTS clips_last_used ON clips (last_used)")
+            connection.execute("CREATE TABLE IF NOT EXISTS clip_urls (key TEXT PRIMARY KEY, chart_filename TEXT, "
+                               "url TEXT, expires REAL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS clip_urls_chart_filename ON clip_urls (chart_filename)")
+            DISK_BYTES[db_path] = connection.execute("SELECT COALESCE(SUM(size), 0) FROM clips").fetchone()[0]
+            CONNECTIONS[db_path] = connection
+        self.db_path = db_path
+        self.connection = CONNECTIONS[db_path]
+
+    @staticmethod
+    def get_key(chart_filename: str, start_column: int, end_column: int, use_doubles_spacing: bool,
+                clip_options: ClipOptions, version: float) -> str:
+        return f"{chart_filename}:{start_column}:{end_column}:{'D' if use_doubles_spacing else 'S'}:" \
+               f"{msgspec.json.encode(clip_options).decode()}:{version!r}"
+
+    def get(self, chart_filename: str, key: str) -> bytes | None:
+        data = MEMORY_TIER.get((self.game_folder, chart_filename, key))
+        if data is not None:
+            return data
+        with self.connection.lock:
+            row = self.connection.execute("SELECT data FROM clips WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self.connection.execute("UPDATE clips SET last_used = ? WHERE key = ?", (time.time(), key))
+        MEMORY_TIER.put((self.game_folder, chart_filename, key), row[0])
+        return row[0]
+
+    def put(self, chart_filename: str, key: str, data: bytes):
+        MEMORY_TIER.put((self.game_folder, chart_filename, key), data)
+        if len(data) > self.max_disk_bytes:
+            return
+        with self.connection.lock, self.connection:
+            self.connection.execute("BEGIN")
+            replaced = self.connection.execute("SELECT size FROM clips WHERE key = ?", (key,)).fetchone()
+            self.connection.execute("INSERT OR REPLACE INTO clips VALUES (?, ?, ?, ?, ?)",
+                                    (key, chart_filename, len(data), data, time.time()))
+            disk_bytes = DISK_BYTES[self.db_path] + len(data) - (replaced[0] if replaced is not None else 0)
+            # Walks the clips from least to most recently used until enough of them are gone to fit the budget.
+            overflow = disk_bytes - self.max_disk_bytes
+            if overflow > 0:
+                evicted = []
+                for evicted_key, size in self.connection.execute("SELECT key, size FROM clips ORDER BY last_used"):
+                    if overflow <= 0:
+                        break
+                    evicted.append((evicted_key,))
+                    overflow -= size
+                    disk_bytes -= size
+                self.connection.executemany("DELETE FROM clips WHERE key = ?", evicted)
+        # Only kept once the transaction has gone through.
+        DISK_BYTES[self.db_path] = disk_bytes
+
+    def get_url(self, key: str) -> tuple[str, float | None] | None:
+        # Gets the CDN URL a clip was uploaded to, and when that URL stops working (if the URL says).
+        with self.connection.lock:
+            return self.connection.execute("SELECT url, expires FROM clip_urls WHERE key = ?", (key,)).fetchone()
+
+    def put_url(self, chart_filename: str, key: str, url: str):
+        # Discord signs attachment URLs, and the ex parameter is when the signature runs out (hex Unix time).
+        expires = parse_qs(urlparse(url).query).get("ex")
+        with self.connection.lock:
+            self.connection.execute("INSERT OR REPLACE INTO clip_urls VALUES (?, ?, ?, ?)",
+                                    (key, chart_filename, url, int(expires[0], 16) if expires else None))
+
+    def remove_url(self, key: str):
+        with self.connection.lock:
+            self.connection.execute("DELETE FROM clip_urls WHERE key = ?", (key,))
+
+    def invalidate(self, chart_filename: str):
+        MEMORY_TIER.remove_prefix((self.game_folder, chart_filename))
+        with self.connection.lock, self.connection:
+            self.connection.execute("BEGIN")
+            # Summed up separately rather than with DELETE ... RETURNING, which needs SQLite 3.35.
+            removed_bytes = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM clips WHERE chart_filename = ?",
+                                                    (chart_filename,)).fetchone()[0]
+            self.connection.execute("DELETE FROM clips WHERE chart_filename = ?", (chart_filename,))
+            self.connection.execute("DELETE FROM clip_urls WHERE chart_filename = ?", (chart_filename,))
+        DISK_BYTES[self.db_path] -= removed_bytes
@@ -1,7 +1,59 @@
+import os
+
 from definitions import ROOT_DIR
 
 DEFAULT_BARCLIP = "1-15"
 BARCLIP_REGEX = "(?i)(\d{1,3})-(\d{1,3})"
 SONG_DATA_FOLDER = ROOT_DIR + "/data/songs/"
-OUTPUT_FILE_NAME = "output.png"
-SDVXPLUS_CLOUDFRONT = "https://d1v18l4r9qkmgu.cloudfront.net/"
\ No newline at end of file
+SDVXPLUS_CLOUDFRONT = "https://d1v18l4r9qkmgu.cloudfront.net/"
+THREEICECREAM_URL = os.getenv("THREEICECREAM_URL", "https://3icecream.com")
+# 3icecream only makes a chart image once its page has been opened, and keeps it for a few seconds. The image is
+# polled for this long after each page view, and the whole thing is tried this many times.
+THREEICECREAM_IMAGE_POLL_SECONDS = float(os.getenv("THREEICECREAM_IMAGE_POLL_SECONDS", 5))
+THREEICECREAM_IMAGE_POLL_INTERVAL = 0.25
+THREEICECREAM_ATTEMPTS = int(os.getenv("THREEICECREAM_ATTEMPTS", 3))
+THREEICECREAM_RETRY_BACKOFF = 1
+OCR_DIGITS_CONFIG = "--oem 3 -c tessedit_char_whitelist=0123456789"
+OCR_MIN_BOX_CONFIDENCE = 60
+TEMPLATE_FILE_NAME = "digit-templates.npy"
+TEMPLATE_GLYPH_SIZE = (12, 20)
+TEMPLATE_MIN_CORRELATION = 0.8
+TEMPLATE_MIN_SAMPLES = 3
+TEMPLATE_MAX_CHARTS = 50
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", os.cpu_count() or 1))
+RENDER_QUEUE_DEPTH = int(os.getenv("RENDER_QUEUE_DEPTH", 32))
+RENDER_HEALTH_CHECK_INTERVAL = int(os.getenv("RENDER_HEALTH_CHECK_INTERVAL", 60))
+RENDER_HEALTH_CHECK_TIMEOUT = int(os.getenv("RENDER_HEALTH_CHECK_TIMEOUT", 10))
+OCR_MIN_INK_PIXELS = 10
+OCR_MIN_INK_HEIGHT_PX = 5
+ROI_CACHE_FILE_NAME = "roi-cache.sqlite"
+ROI_CACHE_MAX_ENTRIES = int(os.getenv("ROI_CACHE_MAX_ENTRIES", 50000))
+MEASURE_INDEX_FILE_NAME = "measures.sqlite"
+MEASURE_DEFAULT_STEP = 3
+MEASURE_INTERPOLATED_CONFIDENCE = 50
+MEASURE_EXTRAPOLATED_CONFIDENCE = 25
+MEASURE_MIN_CONFIDENCE = 60
+CLIP_CACHE_FILE_NAME = "clip-cache.sqlite"
+CLIP_CACHE_MEMORY_BYTES = int(os.getenv("CLIP_CACHE_MEMORY_BYTES", 64 * 1024 * 1024))
+CLIP_CACHE_DISK_BYTES = int(os.getenv("CLIP_CACHE_DISK_BYTES", 1024 * 1024 * 1024))
+CLIP_URL_EXPIRY_MARGIN = int(os.getenv("CLIP_URL_EXPIRY_MARGIN", 60 * 60))
+CLIP_URL_CHECK_TIMEOUT = 5
+TILE_FOLDER_SUFFIX = "-tiles"
+HOT_CHART_FILE_NAME = "hot-charts.sqlite"
+HOT_CHART_FOLDER = "hot/"
+HOT_CHART_MIN_REQUESTS = int(os.getenv("HOT_CHART_MIN_REQUESTS", 5))
+HOT_CHART_MAX_BYTES = int(os.getenv("HOT_CHART_MAX_BYTES", 2 * 1024 * 1024 * 1024))
+# Discord's upload limit for bots without boosts, and the biggest image it shows without downscaling.
+CLIP_MAX_BYTES = int(os.getenv("CLIP_MAX_BYTES", 10 * 1024 * 1024))
+CLIP_MAX_DIMENSION_PX = 4096
+CLIP_ROW_GAP_PX = 12
+CLIP_BACKGROUND_COLOR = (0, 0, 0)
+PNG_INDEXED_MAX_COLORS = 256
+PNG_INDEXED_CHUNK_SIZE = 4096
+CLIP_TARGET_BYTES = int(os.getenv("CLIP_TARGET_BYTES", 1024 * 1024))
+IMAGE_INDEX_FILE_NAME = "images.sqlite"
+IMAGE_REVALIDATE_INTERVAL = int(os.getenv("IMAGE_REVALIDATE_INTERVAL", 7 * 24 * 60 * 60))
+# How long a chart the site doesn't have (or sent something other than a chart for) is failed straight away for, and
+# how long for one the site couldn't be reached for.
+CHART_UNAVAILABLE_TTL = int(os.getenv("CHART_UNAVAILABLE_TTL", 60 * 60))
+CHART_UPSTREAM_ERROR_TTL = int(os.getenv("CHART_UPSTREAM_ERROR_TTL", 60))
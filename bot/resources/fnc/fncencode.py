@@ -0,0 +1,89 @@
+import struct
+import zlib
+
+import cv2
+import numpy
+
+from bot.resources.fnc.fncconstants import PNG_INDEXED_MAX_COLORS, PNG_INDEXED_CHUNK_SIZE
+from bot.resources.models.enums import ClipEncoding
+
+
+def encode_png(img: numpy.ndarray, compression: int | None = None) -> bytes:
+    params = [cv2.IMWRITE_PNG_COMPRESSION, compression] if compression is not None else []
+    return cv2.imencode(".png", img, params)[1].tobytes()
+
+
+def get_png_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(chunk_type + data))
+
+
+def get_palette(img: numpy.ndarray) -> tuple[numpy.ndarray, numpy.ndarray]:
+    # Gets a palette of up to 256 colors (BGR) for the image, and the palette index of every pixel. Charts are
+    # mostly flat colors, so they usually fit and nothing changes. If they don't, the most common colors make the
+    # palette, and every other color is swapped for the closest one in it (only anti-aliased edges, in practice).
+    # Every color is packed into 24 bits, so a lookup table over all of them replaces sorting the pixels.
+    packed = (img[..., 0].astype(numpy.uint32) << 16) | (img[..., 1].astype(numpy.uint32) << 8) | img[..., 2]
+    seen = numpy.zeros(1 << 24, dtype=bool)
+    seen[packed] = True
+    colors = numpy.flatnonzero(seen).astype(numpy.uint32)
+    lookup = numpy.zeros(1 << 24, dtype=numpy.int32)
+    lookup[colors] = numpy.arange(colors.size)
+    inverse = lookup[packed].ravel()
+    unpacked = numpy.stack([colors >> 16, (colors >> 8) & 0xFF, colors & 0xFF], axis=1).astype(numpy.int32)
+    if colors.size <= PNG_INDEXED_MAX_COLORS:
+        return unpacked.astype(numpy.uint8), inverse.astype(numpy.uint8)
+
+    counts = numpy.bincount(inverse, minlength=colors.size)
+    palette = unpacked[numpy.argsort(counts)[-PNG_INDEXED_MAX_COLORS:]]
+    nearest = numpy.empty(colors.size, dtype=numpy.uint8)
+    # In chunks, since every color gets compared against the whole palette.
+    for start in range(0, colors.size, PNG_INDEXED_CHUNK_SIZE):
+        chunk = unpacked[start:start + PNG_INDEXED_CHUNK_SIZE]
+        distances = ((chunk[:, None, :] - palette[None, :, :]) ** 2).sum(axis=2)
+        nearest[start:start + PNG_INDEXED_CHUNK_SIZE] = distances.argmin(axis=1)
+    return palette.astype(numpy.uint8), nearest[inverse]
+
+
+def encode_indexed_png(img: numpy.ndarray) -> bytes:
+    # OpenCV can't write palette PNGs, so the chunks are put together by hand. Every row uses filter type 0 (none).
+    h, w = img.shape[:2]
+    palette, indices = get_palette(img)
+    rows = numpy.hstack([numpy.zeros((h, 1), dtype=numpy.uint8), indices.reshape(h, w)])
+    return b"".join([b"\x89PNG\r\n\x1a\n",
+                     get_png_chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 3, 0, 0, 0)),
+                     get_png_chunk(b"PLTE", palette[:, ::-1].tobytes()),
+                     get_png_chunk(b"IDAT", zlib.compress(rows.tobytes(), 9)),
+                     get_png_chunk(b"IEND", b"")])
+
+
+def encode_webp_lossless(img: numpy.ndarray) -> bytes:
+    # Any quality above 100 makes OpenCV's WebP encoder lossless.
+    return cv2.imencode(".webp", img, [cv2.IMWRITE_WEBP_QUALITY, 101])[1].tobytes()
+
+
+def encode(img: numpy.ndarray, encoding: ClipEncoding) -> bytes:
+    match encoding:
+        case ClipEncoding.PNG:
+            return encode_png(img)
+        case ClipEncoding.PNG_SMALLEST:
+            return encode_png(img, 9)
+        case ClipEncoding.PNG_INDEXED:
+            return encode_indexed_png(img)
+        case ClipEncoding.WEBP_LOSSLESS:
+            return encode_webp_lossless(img)
+
+
+def encode_within_budget(img: numpy.ndarray, encodings: list[ClipEncoding], max_bytes: int) -> bytes:
+    # Uses the first encoding that fits in max_bytes, or the smallest one if none of them do.
+    smallest = None
+    for encoding in encodings:
+        data = encode(img, encoding)
+        if len(data) <= max_bytes:
+            return data
+        if smallest is None or len(data) < len(smallest):
+            smallest = data
+    return smallest
+
+
+def get_file_extension(data: bytes) -> str:
+    return "webp" if data[:4] == b"RIFF" and data[8:12] == b"WEBP" else "png"
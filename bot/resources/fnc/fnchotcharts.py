@@ -0,0 +1,90 @@
+import os
+
+from bot.resources.fnc.fncconstants import HOT_CHART_FILE_NAME, HOT_CHART_FOLDER, HOT_CHART_MAX_BYTES, \
+    HOT_CHART_MIN_REQUESTS
+from bot.utils.sqliteutils import connect
+
+# One connection per database per process.
+CONNECTIONS = {}
+
+
+class HotChartStore:
+    def __init__(self, game_folder: str, max_bytes: int = HOT_CHART_MAX_BYTES,
+                 min_requests: int = HOT_CHART_MIN_REQUESTS):
+        """
+        Keeps the decoded pixels of the most requested charts of a game on the drive as raw .npy files. Those are
+        memory mapped instead of decoded, so cropping one is just a slice, and every render worker shares the same
+        pages through the OS page cache.
+
+        Every request of a chart is counted. A chart is promoted once it has been requested min_requests times, and
+        when the hot charts would go over max_bytes, the least requested ones are evicted to make room. A chart is
+        only promoted if it has been requested more than everything it would evict.
+
+        game_folder - The folder the game's song folders live in, ending in a slash.
+        """
+        self.max_bytes = max_bytes
+        self.min_requests = min_requests
+        self.folder = f"{game_folder}{HOT_CHART_FOLDER}"
+        db_path = f"{game_folder}{HOT_CHART_FILE_NAME}"
+        if db_path not in CONNECTIONS:
+            connection = connect(db_path)
+            connection.execute("CREATE TABLE IF NOT EXISTS charts (chart_filename TEXT PRIMARY KEY, "
+                               "requests INTEGER, size INTEGER, hot INTEGER)")
+            CONNECTIONS[db_path] = connection
+        self.connection = CONNECTIONS[db_path]
+
+    def get_path(self, chart_filename: str) -> str:
+        return f"{self.folder}{chart_filename}.npy"
+
+    def record_request(self, chart_filename: str):
+        with self.connection.lock:
+            self.connection.execute("INSERT INTO charts VALUES (?, 1, NULL, 0) ON CONFLICT (chart_filename) "
+                                    "DO UPDATE SET requests = requests + 1", (chart_filename,))
+
+    def record_size(self, chart_filename: str, size: int):
+        # Remembers how big a chart is once decoded, so whether it fits can be worked out without decoding it.
+        with self.connection.lock:
+            self.connection.execute("UPDATE charts SET size = ? WHERE chart_filename = ?", (size, chart_filename))
+
+    def is_hot(self, chart_filename: str) -> bool:
+        with self.connection.lock:
+            return self.connection.execute("SELECT 1 FROM charts WHERE chart_filename = ? AND hot = 1",
+                                           (chart_filename,)).fetchone() is not None
+
+    def get_evictions(self, chart_filename: str) -> list[str] | None:
+        # Gets the hot charts that have to go to make room for a chart, or None if it shouldn't be promoted.
+        with self.connection.lock:
+            row = self.connection.execute("SELECT requests, size, hot FROM charts WHERE chart_filename = ?",
+                                          (chart_filename,)).fetchone()
+            if row is None or row[1] is None or row[2] or row[0] < self.min_requests or row[1] > self.max_bytes:
+                return None
+            requests, size, _ = row
+            overflow = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM charts WHERE hot = 1") \
+                .fetchone()[0] + size - self.max_bytes
+            hot_charts = self.connection.execute("SELECT chart_filename, requests, size FROM charts WHERE hot = 1 "
+                                                 "ORDER BY requests").fetchall()
+        evictions = []
+        for hot_chart_filename, hot_requests, hot_size in hot_charts:
+            if overflow <= 0:
+                break
+            if hot_requests >= requests:
+                return None
+            evictions.append(hot_chart_filename)
+            overflow -= hot_size
+        return evictions
+
+    def promote(self, chart_filename: str, evictions: list[str]):
+        # Marks a chart as hot once its .npy file has been written, and evicts the charts that made room for it.
+        for hot_chart_filename in evictions:
+            self.demote(hot_chart_filename)
+        with self.connection.lock:
+            self.connection.execute("UPDATE charts SET hot = 1 WHERE chart_filename = ?", (chart_filename,))
+
+    def demote(self, chart_filename: str):
+        # Workers that already have the file mapped keep working off of it until they're done.
+        with self.connection.lock:
+            self.connection.execute("UPDATE charts SET hot = 0 WHERE chart_filename = ?", (chart_filename,))
+        try:
+            os.remove(self.get_path(chart_filename))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,57 @@
+from multiprocessing import shared_memory
+
+import cv2
+import numpy
+from msgspec import Struct
+
+
+class SharedImage(Struct, kw_only=True):
+    # A decoded chart image living in shared memory, so the render workers can all use it without it being decoded
+    # (or pickled) again. Only this handle gets passed around.
+    name: str
+    shape: tuple[int, int, int]
+
+
+class AttachedImage:
+    def __init__(self, image: SharedImage):
+        """
+        Maps a SharedImage into this process for the length of a with block. The array has to be gone by the time
+        the block ends, so only pass attached.array along and never keep a reference to it (or a view of it).
+        """
+        self.image = image
+        self.shm = None
+        self.array = None
+
+    def __enter__(self):
+        self.shm = shared_memory.SharedMemory(name=self.image.name)
+        self.array = numpy.ndarray(self.image.shape, dtype=numpy.uint8, buffer=self.shm.buf)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.array = None
+        self.shm.close()
+
+
+def decode_image(image_bytes: bytes, min_width: int = 0, min_height: int = 0) -> SharedImage:
+    # Decodes an image straight into shared memory. This runs in a render worker, and the memory stays around after
+    # the worker is done with it - it's freed by release_image() once the request is finished. Images smaller than
+    # min_width x min_height are rejected the same way as ones that can't be decoded, since they can't be a chart.
+    img = cv2.imdecode(numpy.frombuffer(image_bytes, dtype=numpy.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("Chart image could not be decoded.")
+    if img.shape[1] < min_width or img.shape[0] < min_height:
+        raise ValueError(f"Chart image is {img.shape[1]}x{img.shape[0]}, which is too small to be a chart.")
+    shm = shared_memory.SharedMemory(create=True, size=img.nbytes)
+    numpy.ndarray(img.shape, dtype=numpy.uint8, buffer=shm.buf)[:] = img
+    image = SharedImage(name=shm.name, shape=img.shape)
+    shm.close()
+    return image
+
+
+def release_image(image: SharedImage):
+    try:
+        shm = shared_memory.SharedMemory(name=image.name)
+    except FileNotFoundError:
+        return
+    shm.close()
+    shm.unlink()
@@ -0,0 +1,52 @@
+import time
+
+from bot.resources.fnc.fncconstants import IMAGE_INDEX_FILE_NAME
+from bot.utils.sqliteutils import connect
+
+# One connection per database per process.
+CONNECTIONS = {}
+
+
+class ImageIndex:
+    def __init__(self, game_folder: str):
+        """
+        Keeps the ETag and Last-Modified headers every chart image of a game was downloaded with, and when the site
+        was last asked whether it changed. Images on the drive are used as they are, and only checked again with a
+        conditional request once in a while (see claim_revalidation()), which costs next to nothing when the image
+        is the same.
+
+        game_folder - The folder the game's song folders live in, ending in a slash.
+        """
+        db_path = f"{game_folder}{IMAGE_INDEX_FILE_NAME}"
+        if db_path not in CONNECTIONS:
+            connection = connect(db_path)
+            connection.execute("CREATE TABLE IF NOT EXISTS images (chart_filename TEXT PRIMARY KEY, etag TEXT, "
+                               "last_modified TEXT, checked REAL)")
+            CONNECTIONS[db_path] = connection
+        self.connection = CONNECTIONS[db_path]
+
+    def get_validators(self, chart_filename: str) -> tuple[str | None, str | None]:
+        # Gets the ETag and Last-Modified headers of the image on the drive, if the site sent them.
+        with self.connection.lock:
+            row = self.connection.execute("SELECT etag, last_modified FROM images WHERE chart_filename = ?",
+                                          (chart_filename,)).fetchone()
+        return row if row is not None else (None, None)
+
+    def put(self, chart_filename: str, etag: str | None, last_modified: str | None):
+        with self.connection.lock:
+            self.connection.execute("INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?)",
+                                    (chart_filename, etag, last_modified, time.time()))
+
+    def claim_revalidation(self, chart_filename: str, interval: float) -> bool:
+        # Returns True if the image hasn't been checked in the last interval seconds, and marks it as checked so
+        # nobody else (in this process or another) checks it at the same time. Images downloaded before the index
+        # existed count as never checked.
+        now = time.time()
+        with self.connection.lock:
+            return self.connection.execute("INSERT INTO images VALUES (?, NULL, NULL, ?) ON CONFLICT (chart_filename) "
+                                           "DO UPDATE SET checked = excluded.checked WHERE checked < ?",
+                                           (chart_filename, now, now - interval)).rowcount > 0
+
+    def remove(self, chart_filename: str):
+        with self.connection.lock:
+            self.connection.execute("DELETE FROM images WHERE chart_filename = ?", (chart_filename,))
@@ -0,0 +1,110 @@
+import glob
+import logging
+import os
+import time
+
+import msgspec
+
+from bot.resources.fnc.fncconstants import MEASURE_INDEX_FILE_NAME
+from bot.utils.sqliteutils import connect
+
+# One connection per database per process.
+CONNECTIONS = {}
+
+
+class MeasureIndex:
+    def __init__(self, game_folder: str):
+        """
+        The measures of every chart of a game that has been read, in a single SQLite table keyed by chart filename.
+        This replaces the measures-*.json file that used to be written next to each chart image. Those files are
+        imported (and deleted) the first time the index is opened.
+
+        game_folder - The folder the game's song folders live in, ending in a slash.
+        """
+        self.game_folder = game_folder
+        db_path = f"{game_folder}{MEASURE_INDEX_FILE_NAME}"
+        if db_path not in CONNECTIONS:
+            connection = connect(db_path)
+            connection.execute("CREATE TABLE IF NOT EXISTS measures (chart_filename TEXT PRIMARY KEY, "
+                               "song_folder TEXT, measures BLOB, updated REAL)")
+            connection.execute("CREATE TABLE IF NOT EXISTS migrations (name TEXT PRIMARY KEY)")
+            if "confidences" not in [row[1] for row in connection.execute("PRAGMA table_info(measures)")]:
+                # Indexes made before confidences were kept. NULL means the confidences of a chart aren't known.
+                connection.execute("ALTER TABLE measures ADD COLUMN confidences BLOB")
+            CONNECTIONS[db_path] = connection
+        self.connection = CONNECTIONS[db_path]
+        self.migrate_json_files()
+
+    def migrate_json_files(self):
+        # Imports the measures of charts read before the index existed. Everything goes in with one transaction, and
+        # the old files are only deleted once it has been committed.
+        if self.connection.execute("SELECT 1 FROM migrations WHERE name = 'json'").fetchone() is not None:
+            return
+        measure_paths = glob.glob(f"{self.game_folder}*/measures-*.json")
+        rows = []
+        for measure_path in measure_paths:
+            folder, measure_file = os.path.split(measure_path)
+            chart_filename = measure_file.removeprefix("measures-").removesuffix(".json")
+            with open(measure_path, "rb") as fp:
+                measures = msgspec.json.decode(fp.read(), type=dict[int, int])
+            rows.append((chart_filename, os.path.basename(folder), msgspec.json.encode(measures), time.time(), None))
+        with self.connection.lock, self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            # Another process may have migrated while this one was reading the files.
+            if self.connection.execute("SELECT 1 FROM migrations WHERE name = 'json'").fetchone() is not None:
+                return
+            self.connection.executemany("INSERT OR IGNORE INTO measures VALUES (?, ?, ?, ?, ?)", rows)
+            self.connection.execute("INSERT INTO migrations VALUES ('json')")
+        for measure_path in measure_paths:
+            os.remove(measure_path)
+        if rows:
+            logging.warning(f"Moved the measures of {len(rows)} charts from JSON files into {self.game_folder}"
+                            f"{MEASURE_INDEX_FILE_NAME}.")
+
+    def contains(self, chart_filename: str) -> bool:
+        with self.connection.lock:
+            return self.connection.execute("SELECT 1 FROM measures WHERE chart_filename = ?",
+                                           (chart_filename,)).fetchone() is not None
+
+    def get(self, chart_filename: str) -> dict[int, int] | None:
+        with self.connection.lock:
+            row = self.connection.execute("SELECT measures FROM measures WHERE chart_filename = ?",
+                                          (chart_filename,)).fetchone()
+        return msgspec.json.decode(row[0], type=dict[int, int]) if row is not None else None
+
+    def get_updated(self, chart_filename: str) -> float | None:
+        # Gets when a chart's measures were last saved. This changes every time they're saved, so it doubles as
+        # their version.
+        with self.connection.lock:
+            row = self.connection.execute("SELECT updated FROM measures WHERE chart_filename = ?",
+                                          (chart_filename,)).fetchone()
+        return row[0] if row is not None else None
+
+    def get_confidences(self, chart_filename: str) -> dict[int, float] | None:
+        # Gets how much each of a chart's measures can be trusted (0-100), if that's known.
+        with self.connection.lock:
+            row = self.connection.execute("SELECT confidences FROM measures WHERE chart_filename = ?",
+                                          (chart_filename,)).fetchone()
+        return msgspec.json.decode(row[0], type=dict[int, float]) if row is not None and row[0] is not None else None
+
+    def put(self, chart_filename: str, song_folder: str, measures: dict[int, int],
+            confidences: dict[int, float] | None = None) -> float:
+        # A single statement, so concurrent writers (the bot and the indexer) never see a half-written chart.
+        # Returns the version the measures were saved as (see get_updated()).
+        updated = time.time()
+        with self.connection.lock:
+            self.connection.execute("INSERT OR REPLACE INTO measures VALUES (?, ?, ?, ?, ?)",
+                                    (chart_filename, song_folder, msgspec.json.encode(measures), updated,
+                                     msgspec.json.encode(confidences) if confidences is not None else None))
+        return updated
+
+    def remove(self, chart_filename: str):
+        with self.connection.lock:
+            self.connection.execute("DELETE FROM measures WHERE chart_filename = ?", (chart_filename,))
+
+    def get_all(self) -> list[tuple[str, str, dict[int, int]]]:
+        # Gets the chart filename, song folder (relative to the game folder) and measures of every chart.
+        with self.connection.lock:
+            rows = self.connection.execute("SELECT chart_filename, song_folder, measures FROM measures").fetchall()
+        return [(chart_filename, song_folder, msgspec.json.decode(measures, type=dict[int, int]))
+                for chart_filename, song_folder, measures in rows]
@@ -0,0 +1,98 @@
+import numpy
+
+from bot.resources.fnc.fncconstants import MEASURE_DEFAULT_STEP, MEASURE_INTERPOLATED_CONFIDENCE, \
+    MEASURE_EXTRAPOLATED_CONFIDENCE
+
+
+def fit_isotonic(values: numpy.ndarray, weights: numpy.ndarray) -> numpy.ndarray:
+    # Finds the non-decreasing sequence closest to values (weighted least squares) with the pool adjacent violators
+    # algorithm. Each block holds the weighted mean of the values pooled into it.
+    means: list[float] = []
+    totals: list[float] = []
+    counts: list[int] = []
+    for value, weight in zip(values.tolist(), weights.tolist()):
+        means.append(value)
+        totals.append(weight)
+        counts.append(1)
+        while len(means) > 1 and means[-2] > means[-1]:
+            total = totals[-2] + totals[-1]
+            means[-2] = (means[-2] * totals[-2] + means[-1] * totals[-1]) / total
+            totals[-2] = total
+            counts[-2] += counts[-1]
+            del means[-1], totals[-1], counts[-1]
+    return numpy.repeat(means, counts)
+
+
+def get_median_step(columns: numpy.ndarray, numbers: numpy.ndarray, tolerance: int) -> float:
+    # The typical number of measures per column, from the steps between neighbouring reads that go up by less than
+    # the tolerance. Unlike the average, one wildly misread number can't drag this around.
+    steps = numpy.diff(numbers) / numpy.diff(columns)
+    steps = steps[(steps > 0) & (steps < tolerance)]
+    return float(numpy.median(steps)) if steps.size else MEASURE_DEFAULT_STEP
+
+
+def find_consensus(columns: numpy.ndarray, numbers: numpy.ndarray, confidences: numpy.ndarray, step: float,
+                   tolerance: int) -> numpy.ndarray:
+    # Finds the biggest set of reads that agree with each other, and returns a mask of them. Two reads agree if
+    # the measures between them are within the tolerance of what the median step says there should be, and a set
+    # agrees if every read in it agrees with the one before it. A misread (a dropped or extra digit, a wrong digit)
+    # can't agree with the reads around it, so it's left out. This is worked out over the whole chart rather than
+    # over a window of neighbours, so even a run of misreads that outnumbers the reads around it (at the very end
+    # of a chart, for example) is left out, as long as the chart has more good reads than misreads. The OCR
+    # confidence of each read only breaks ties.
+    scores = numpy.zeros(numbers.size)
+    previous = numpy.full(numbers.size, -1)
+    for i in range(numbers.size):
+        agrees = numpy.abs(numbers[i] - numbers[:i] - step * (columns[i] - columns[:i])) < tolerance
+        if agrees.any():
+            # The latest of the best reads to follow, so the set stays as tight as possible.
+            candidates = numpy.where(agrees, scores[:i], -1)
+            previous[i] = i - 1 - int(numpy.argmax(candidates[::-1]))
+            scores[i] = scores[previous[i]]
+        # Every read counts for 1, plus a share of its confidence too small to ever outweigh another read.
+        scores[i] += 1 + confidences[i] / (100 * (numbers.size + 1))
+    kept = numpy.zeros(numbers.size, dtype=bool)
+    i = numbers.size - 1 - int(numpy.argmax(scores[::-1]))
+    while i >= 0:
+        kept[i] = True
+        i = previous[i]
+    return kept
+
+
+def repair_measures(numbers: numpy.ndarray, confidences: numpy.ndarray,
+                    tolerance: int) -> tuple[numpy.ndarray, numpy.ndarray]:
+    # Turns the raw reads of every column into a strictly increasing measure sequence, along with how much each
+    # repaired number can be trusted (0-100). Column 0 is always measure 1.
+    #  1. Blank/unread columns and reads that don't agree with the rest (see find_consensus()) are thrown away
+    #     before anything is fitted, so misreads never get pooled into the fit.
+    #  2. An isotonic fit of what's left removes any remaining dips, weighted by the OCR confidence of each read.
+    #  3. Every thrown away column is filled in by interpolating between the kept columns around it, or by
+    #     extrapolating with the median step past the last one.
+    # Reads that are kept keep their OCR confidence. Filled in columns get a fixed, lower confidence.
+    numbers = numpy.asarray(numbers, dtype=numpy.float64).copy()
+    confidences = numpy.asarray(confidences, dtype=numpy.float64).copy()
+    numbers[0], confidences[0] = 1, 100
+    columns = numpy.arange(numbers.size, dtype=numpy.float64)
+
+    kept = numbers > 0
+    step = get_median_step(columns[kept], numbers[kept], tolerance)
+    kept[kept] = find_consensus(columns[kept], numbers[kept], confidences[kept], step, tolerance)
+    kept[0] = True
+
+    fitted = fit_isotonic(numbers[kept], numpy.maximum(confidences[kept], 1))
+    changed = numpy.zeros_like(kept)
+    changed[kept] = numpy.abs(fitted - numbers[kept]) >= 0.5
+    numbers[kept] = fitted
+
+    last_kept = columns[kept][-1]
+    repaired = numpy.interp(columns, columns[kept], numbers[kept])
+    repaired += numpy.where(columns > last_kept, (columns - last_kept) * step, 0)
+    repaired = numpy.rint(repaired).astype(numpy.int64)
+    # Rounding can leave two columns on the same measure, so nudge anything that doesn't go up.
+    offsets = numpy.arange(repaired.size)
+    repaired = numpy.maximum.accumulate(repaired - offsets) + offsets
+
+    repaired_confidences = numpy.where(kept & ~changed, confidences,
+                                       numpy.where(columns > last_kept, MEASURE_EXTRAPOLATED_CONFIDENCE,
+                                                   MEASURE_INTERPOLATED_CONFIDENCE))
+    return repaired, repaired_confidences
@@ -0,0 +1,40 @@
+from msgspec import Struct, field
+
+from bot.resources.fnc.fncconstants import CLIP_MAX_BYTES
+from bot.resources.models.enums import ClipEncoding
+
+
+class FncGeometry(Struct, kw_only=True):
+    # Everything needed to find the measure numbers and columns of a chart image. This gets sent to the render
+    # workers, so it only holds plain values. See FncStrategy.__init__() for what each value means.
+    x1_left_px: int = 0
+    x2_left_px: int = 0
+    y1_bottom_px: int = 0
+    y2_bottom_px: int = 0
+    spacing_px: int = 0
+    bottom_cutoff_px: int = 0
+    ocr_scale_multiplier: int = 1
+    ocr_scale_tiers: list[int] = []
+
+
+class ClipOptions(Struct, kw_only=True):
+    # How a clip is laid out and encoded. This gets sent to the render workers, and is part of the clip cache key.
+    # The encodings are tried in order, and the first one that fits in max_bytes is used. If none do, the smallest
+    # one is used anyway - clips only get scaled down to fit Discord's own limits (see fncrender.encode_clip()).
+    columns_per_row: int | None = None
+    encodings: list[ClipEncoding] = field(default_factory=lambda: [ClipEncoding.PNG])
+    max_bytes: int = CLIP_MAX_BYTES
+
+
+class OcrResult(Struct, kw_only=True):
+    # The measure number read from every column after the first, and how confident the read was (0-100).
+    # Blank columns are read as 0 with a confidence of 0, and are marked in blank. skipped_columns is how many of
+    # them were found to be blank without needing OCR, and cache_hits/cache_misses are how many of the rest were
+    # found in the ROI cache. escalated_columns is how many reads were redone at a bigger scale.
+    measure_numbers: list[int] = []
+    confidences: list[float] = []
+    blank: list[bool] = []
+    skipped_columns: int = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    escalated_columns: int = 0
@@ -0,0 +1,258 @@
+import logging
+import os
+
+import cv2
+import numpy
+import pytesseract
+
+from bot.resources.fnc.fncconstants import OCR_DIGITS_CONFIG, OCR_MIN_BOX_CONFIDENCE, OCR_MIN_INK_PIXELS, \
+    OCR_MIN_INK_HEIGHT_PX
+from bot.resources.fnc.fncmodels import FncGeometry, OcrResult
+from bot.resources.fnc.fncroicache import RoiCache, get_roi_key
+from bot.resources.fnc.fnctemplates import ocr_columns_template
+from bot.resources.models.enums import OcrBackend
+
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+pytesseract.pytesseract.tesseract_cmd = r'/usr/bin/tesseract'
+
+# The Tesseract engine of this process, loaded once by init_ocr_worker() when the render workers start. Without it
+# (tesserocr isn't installed, or we're not in a render worker), every read starts a new Tesseract process instead.
+OCR_ENGINE = None
+
+
+def extract_measure_rois(img: numpy.ndarray, geometry: FncGeometry, resize_value: int | None = None,
+                         column_nums: list[int] | None = None) -> list[numpy.ndarray]:
+    # Cuts the thresholded measure number ROI out of every column of the chart, skipping the first column
+    # (it's always measure 1), or out of only the given columns. The measure numbers all sit in one thin band near
+    # the bottom of the chart, so only that band gets scaled and binarized - not the whole (sometimes huge) chart.
+    # The band is scaled by the geometry's ocr_scale_multiplier unless another resize_value is given.
+    resize_value = resize_value or geometry.ocr_scale_multiplier
+    h, w, c = img.shape
+    band_top = max(h - geometry.y1_bottom_px, 0)
+    band_bottom = h - geometry.y2_bottom_px
+    cutoff_top = h - geometry.bottom_cutoff_px
+
+    # Pre-process the band for Tesseract. Anything below the bottom cutoff is blacked out, same as the whole chart
+    # used to be. The Otsu threshold is worked out from the whole scaled band, even when only a few columns are
+    # wanted, so a column is binarized the same way no matter which other columns it's read with.
+    band = cv2.cvtColor(img[band_top:band_bottom], cv2.COLOR_BGR2GRAY)
+    band[max(cutoff_top - band_top, 0):] = 0
+    band_rsz = cv2.resize(band, (0, 0), fx=resize_value, fy=resize_value)
+    thresh = cv2.threshold(band_rsz, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)[1]
+
+    # Get basic details about the image, so we can loop over
+    # each column to check the measure numbers.
+    if column_nums is None:
+        column_nums = list(range(1, get_column_count(img, geometry)))
+
+    rois: list[numpy.ndarray] = []
+    for column_num in column_nums:
+        roi_x_1 = (geometry.x1_left_px + (column_num * geometry.spacing_px)) * resize_value
+        roi_x_2 = (geometry.x2_left_px + (column_num * geometry.spacing_px)) * resize_value
+        rois.append(thresh[:, roi_x_1:roi_x_2])
+    return rois
+
+
+def get_column_count(img: numpy.ndarray, geometry: FncGeometry) -> int:
+    return round(img.shape[1] / geometry.spacing_px)
+
+
+def find_blank_rois(rois: list[numpy.ndarray], resize_value: int) -> numpy.ndarray:
+    # Finds the ROIs that don't have a measure number in them (past the end of the chart, padding, specks of noise)
+    # so they can be skipped instead of OCR'd. Every ROI is stacked into one array and the ink pixel count and ink
+    # bounding box height of all of them are worked out at once. Returns a mask of the blank ROIs.
+    if not rois:
+        return numpy.zeros(0, dtype=bool)
+    h = max(roi.shape[0] for roi in rois)
+    w = max(roi.shape[1] for roi in rois)
+    stack = numpy.zeros((len(rois), h, w), dtype=numpy.uint8)
+    valid = numpy.zeros((len(rois), h, w), dtype=bool)
+    for i, roi in enumerate(rois):
+        stack[i, :roi.shape[0], :roi.shape[1]] = roi
+        valid[i, :roi.shape[0], :roi.shape[1]] = True
+
+    # Whichever color covers most of a ROI is its background, everything else is ink.
+    light = (stack > 127) & valid
+    light_background = light.sum(axis=(1, 2)) * 2 > valid.sum(axis=(1, 2))
+    ink = (light != light_background[:, None, None]) & valid
+
+    ink_pixels = ink.sum(axis=(1, 2))
+    ink_rows = ink.any(axis=2)
+    ink_heights = numpy.where(ink_rows.any(axis=1),
+                              h - ink_rows[:, ::-1].argmax(axis=1) - ink_rows.argmax(axis=1), 0)
+    return ((ink_pixels < OCR_MIN_INK_PIXELS * resize_value ** 2) |
+            (ink_heights < OCR_MIN_INK_HEIGHT_PX * resize_value))
+
+
+def read_measure_numbers(rois: list[numpy.ndarray], ocr_backend: OcrBackend, templates: numpy.ndarray | None,
+                         resize_value: int, roi_cache: RoiCache | None = None) -> OcrResult:
+    # Reads the measure number of every ROI. Blank ROIs aren't read at all, they're left as 0 for adjust_measures()
+    # to fill in. ROIs that have been read before are looked up in the ROI cache, and only the rest are OCR'd.
+    blank = find_blank_rois(rois, resize_value)
+    inked_rois = [roi for roi, is_blank in zip(rois, blank) if not is_blank]
+
+    keys = [get_roi_key(roi) for roi in inked_rois] if roi_cache is not None else []
+    cached_reads = roi_cache.get_many(keys) if roi_cache is not None else {}
+    unread = [i for i in range(len(inked_rois)) if not keys or keys[i] not in cached_reads]
+    new_reads = iter(read_rois([inked_rois[i] for i in unread], ocr_backend, templates))
+    reads = [cached_reads[keys[i]] if keys and keys[i] in cached_reads else next(new_reads)
+             for i in range(len(inked_rois))]
+    if roi_cache is not None:
+        # Only remember reads that are believable, a bad read would otherwise be repeated on every chart.
+        roi_cache.put_many({keys[i]: reads[i] for i in unread
+                            if reads[i][0] > 0 and reads[i][1] >= OCR_MIN_BOX_CONFIDENCE})
+
+    inked_reads = iter(reads)
+    all_reads = [(0, 0.0) if is_blank else next(inked_reads) for is_blank in blank]
+    return OcrResult(measure_numbers=[read[0] for read in all_reads], confidences=[read[1] for read in all_reads],
+                     blank=blank.tolist(), skipped_columns=int(blank.sum()), cache_hits=len(inked_rois) - len(unread),
+                     cache_misses=len(unread) if roi_cache is not None else 0)
+
+
+def read_rois(rois: list[numpy.ndarray], ocr_backend: OcrBackend,
+              templates: numpy.ndarray | None) -> list[tuple[int, float]]:
+    # Reads ROIs with the chosen backend. The template backend falls back to batched Tesseract for anything it
+    # doesn't recognize, or for everything if there are no templates yet.
+    reads: list[tuple[int, float]]
+    if not rois:
+        reads = []
+    elif ocr_backend == OcrBackend.TEMPLATE and templates is not None:
+        template_reads = ocr_columns_template(rois, templates)
+        unread = [i for i, read in enumerate(template_reads) if read is None]
+        logging.warning(f"Template matched {len(rois) - len(unread)} of {len(rois)} columns.")
+        fallback_reads = iter(ocr_columns_batched([rois[i] for i in unread]) if unread else [])
+        reads = [read if read is not None else next(fallback_reads) for read in template_reads]
+    elif ocr_backend == OcrBackend.TESSERACT:
+        reads = ocr_columns(rois)
+    else:
+        reads = ocr_columns_batched(rois)
+    return reads
+
+
+def init_ocr_worker():
+    # Loads a digits-only Tesseract engine once for the lifetime of a render worker, so reads only pay for the
+    # recognition itself instead of starting Tesseract and loading eng.traineddata every time.
+    global OCR_ENGINE
+    if tesserocr is None:
+        logging.warning("tesserocr is not installed, OCR will start a new Tesseract process for every read.")
+        return
+    OCR_ENGINE = tesserocr.PyTessBaseAPI(lang='eng', psm=tesserocr.PSM.SINGLE_CHAR)
+    OCR_ENGINE.SetVariable("tessedit_char_whitelist", "0123456789")
+    logging.warning(f"Loaded Tesseract engine in render worker {os.getpid()}.")
+
+
+def ping() -> tuple[int, bool]:
+    # Health check for the render workers. Returns the worker's process ID and whether its engine is loaded.
+    return os.getpid(), OCR_ENGINE is not None
+
+
+def set_engine_image(img: numpy.ndarray):
+    img = numpy.ascontiguousarray(img)
+    h, w = img.shape
+    OCR_ENGINE.SetImageBytes(img.tobytes(), w, h, 1, w)
+
+
+def recognize_digits(roi: numpy.ndarray) -> tuple[str, float]:
+    # Reads a single ROI as one character block. Returns the digits found and Tesseract's confidence (0-100).
+    if OCR_ENGINE is not None:
+        OCR_ENGINE.SetPageSegMode(tesserocr.PSM.SINGLE_CHAR)
+        set_engine_image(roi)
+        return OCR_ENGINE.GetUTF8Text().strip(), float(OCR_ENGINE.MeanTextConf())
+
+    words = [(text, conf) for text, left, width, conf in recognize_words(roi, psm=10)]
+    return "".join(text for text, conf in words), min((conf for text, conf in words), default=0.0)
+
+
+def recognize_words(img: numpy.ndarray, psm: int = 11) -> list[tuple[str, int, int, float]]:
+    # Finds every word on an image using the given Tesseract page segmentation mode (11 is sparse text). Returns the
+    # text, left edge, width and confidence (0-100) of each one.
+    words: list[tuple[str, int, int, float]] = []
+    if OCR_ENGINE is not None:
+        OCR_ENGINE.SetPageSegMode(psm)
+        set_engine_image(img)
+        OCR_ENGINE.Recognize()
+        level = tesserocr.RIL.WORD
+        for word in tesserocr.iterate_level(OCR_ENGINE.GetIterator(), level):
+            text = word.GetUTF8Text(level)
+            if text is None or text.strip() == "":
+                continue
+            x1, y1, x2, y2 = word.BoundingBox(level)
+            words.append((text.strip(), x1, x2 - x1, float(word.Confidence(level))))
+        return words
+
+    data = pytesseract.image_to_data(img, lang='eng', config=f'--psm {psm} {OCR_DIGITS_CONFIG}',
+                                     output_type=pytesseract.Output.DICT)
+    for text, left, width, conf in zip(data["text"], data["left"], data["width"], data["conf"]):
+        if text.strip() == "" or float(conf) < 0:
+            continue  # Not a word, just Tesseract's page/block/line bookkeeping.
+        words.append((text.strip(), left, width, float(conf)))
+    return words
+
+
+def ocr_column(roi: numpy.ndarray) -> tuple[int, float]:
+    # Reads the measure number out of a single ROI. By default, assume it's nothing - we can always fix it
+    # later in adjust_measures().
+    if roi.size == 0:
+        return 0, 0.0
+    data, conf = recognize_digits(roi)
+    return (int(data), conf) if data.isdigit() else (0, 0.0)
+
+
+def ocr_columns(rois: list[numpy.ndarray]) -> list[tuple[int, float]]:
+    # Reads every ROI with its own Tesseract call. The most predictable, but the slowest without a warm engine.
+    return [ocr_column(roi) for roi in rois]
+
+
+def build_roi_strip(rois: list[numpy.ndarray]) -> tuple[numpy.ndarray, list[int]]:
+    # Lays every ROI out side by side on a single strip image and returns the strip plus the x offset of each ROI.
+    # The gap between ROIs is as wide as the tallest ROI so Tesseract never joins two measure numbers into one word.
+    gap_px = max(roi.shape[0] for roi in rois)
+    border = numpy.concatenate([numpy.concatenate((roi[0], roi[-1], roi[:, 0], roi[:, -1]))
+                                for roi in rois if roi.size > 0])
+    background = int(numpy.median(border))
+
+    strip = numpy.full((gap_px * 3, sum(roi.shape[1] for roi in rois) + gap_px * (len(rois) + 1)), background,
+                       dtype=numpy.uint8)
+    offsets: list[int] = []
+    x = gap_px
+    for roi in rois:
+        h, w = roi.shape
+        strip[gap_px:gap_px + h, x:x + w] = roi
+        offsets.append(x)
+        x += w + gap_px
+    return strip, offsets
+
+
+def ocr_columns_batched(rois: list[numpy.ndarray]) -> list[tuple[int, float]]:
+    # Reads every ROI with a single Tesseract call by OCR'ing them all on one strip, then maps each recognized
+    # box back to the ROI it came from. Anything that can't be mapped cleanly (a box spanning two ROIs, two boxes
+    # in one ROI, a low confidence read) is re-read on its own.
+    if not any(roi.size > 0 for roi in rois):
+        return [(0, 0.0)] * len(rois)
+
+    strip, offsets = build_roi_strip(rois)
+    boxes: dict[int, list[tuple[str, float]]] = {i: [] for i in range(len(rois))}
+    ambiguous: set[int] = set()
+    for text, left, width, conf in recognize_words(strip):
+        columns = [i for i, x in enumerate(offsets) if left < x + rois[i].shape[1] and left + width > x]
+        if len(columns) != 1 or not text.isdigit() or conf < OCR_MIN_BOX_CONFIDENCE:
+            ambiguous.update(columns)
+            continue
+        boxes[columns[0]].append((text, conf))
+
+    results: list[tuple[int, float]] = []
+    for i, roi in enumerate(rois):
+        if i in ambiguous or len(boxes[i]) > 1:
+            results.append(ocr_column(roi))
+        elif boxes[i]:
+            results.append((int(boxes[i][0][0]), boxes[i][0][1]))
+        else:
+            results.append((0, 0.0))
+
+    ambiguous.update(i for i in boxes if len(boxes[i]) > 1)
+    logging.warning(f"Batched OCR read {len(rois)} columns in one pass, {len(ambiguous)} needed a fallback read.")
+    return results
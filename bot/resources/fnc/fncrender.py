@@ -0,0 +1,353 @@
+import asyncio
+import concurrent.futures
+import itertools
+import logging
+import math
+import multiprocessing
+import os
+import pickle
+import shutil
+from concurrent.futures.process import BrokenProcessPool
+
+import cv2
+import numpy
+
+from bot.resources.fnc.fncconstants import RENDER_WORKERS, RENDER_QUEUE_DEPTH, RENDER_HEALTH_CHECK_INTERVAL, \
+    RENDER_HEALTH_CHECK_TIMEOUT, OCR_MIN_BOX_CONFIDENCE, CLIP_MAX_BYTES, CLIP_MAX_DIMENSION_PX, CLIP_ROW_GAP_PX, \
+    CLIP_BACKGROUND_COLOR
+from bot.resources.fnc.fncimage import SharedImage, AttachedImage
+from bot.resources.fnc.fncencode import encode_within_budget
+from bot.resources.fnc.fncmodels import FncGeometry, OcrResult, ClipOptions
+from bot.resources.fnc.fncocr import extract_measure_rois, get_column_count, init_ocr_worker, ping, \
+    read_measure_numbers
+from bot.resources.fnc.fncroicache import RoiCache
+from bot.resources.fnc.fnctemplates import build_digit_templates
+from bot.resources.models.enums import OcrBackend
+
+
+class RenderQueueFullError(Exception):
+    pass
+
+
+class RenderJobError(Exception):
+    # Raised in place of an exception of a render job that couldn't be sent back from the worker as it is.
+    pass
+
+
+class RenderWorkerCrashedError(Exception):
+    # Raised when a render job kills the worker running it, even when it's retried in a worker of its own.
+    pass
+
+
+# The slots every worker of a pool keeps the ID of the job it's running in, and which one belongs to this worker.
+# Both are set by init_render_worker(), when the worker starts.
+RUNNING_JOBS = None
+WORKER_SLOT = 0
+
+
+def init_render_worker(running_jobs, next_slot):
+    global RUNNING_JOBS, WORKER_SLOT
+    with next_slot.get_lock():
+        WORKER_SLOT = next_slot.value % len(running_jobs)
+        next_slot.value += 1
+    RUNNING_JOBS = running_jobs
+    init_ocr_worker()
+
+
+def run_job(job_id: int, fn, *args):
+    # Runs a job in a render worker (see RenderService.submit()). An exception that can't be unpickled breaks the
+    # whole pool when it's sent back (Tesseract's errors, for example, can't be), so those are sent back as a
+    # RenderJobError instead. Everything else is raised as it is, so callers can still catch what they expect.
+    RUNNING_JOBS[WORKER_SLOT] = job_id
+    try:
+        return fn(*args)
+    except Exception as e:
+        try:
+            pickle.loads(pickle.dumps(e))
+        except Exception:
+            raise RenderJobError(f"{fn.__name__} failed. Error: {e!r}.") from None
+        raise
+    finally:
+        RUNNING_JOBS[WORKER_SLOT] = 0
+
+
+class RenderPool(concurrent.futures.ProcessPoolExecutor):
+    def __init__(self, max_workers: int):
+        """
+        A pool of render worker processes, where every worker keeps the ID of the job it's running in a slot shared
+        with the bot. When a worker dies and takes the pool with it, that's how the jobs that were running are told
+        apart from the ones that were still waiting their turn.
+
+        max_workers - The number of worker processes.
+        """
+        # Spawn rather than fork - the bot has other threads running (MongoDB, Discord) that don't survive a fork.
+        context = multiprocessing.get_context("spawn")
+        self.running_jobs = context.Array("q", max_workers)
+        super().__init__(max_workers=max_workers, mp_context=context, initializer=init_render_worker,
+                         initargs=(self.running_jobs, context.Value("i", 0)))
+
+    def was_running(self, job_id: int) -> bool:
+        return job_id in self.running_jobs[:]
+
+
+# The jobs below run inside the render worker processes, so they have to be plain module-level functions that only
+# take and return values that can be pickled. Chart images are passed as SharedImages (see fncimage.decode_image()).
+
+
+def ocr_chart(image: SharedImage, geometry: FncGeometry, ocr_backend: OcrBackend, templates: numpy.ndarray | None,
+              roi_cache_path: str | None, column_nums: list[int] | None = None) -> OcrResult:
+    with AttachedImage(image) as attached:
+        return ocr_image(attached.array, geometry, ocr_backend, templates, roi_cache_path, column_nums)
+
+
+def ocr_image(img: numpy.ndarray, geometry: FncGeometry, ocr_backend: OcrBackend, templates: numpy.ndarray | None,
+              roi_cache_path: str | None, column_nums: list[int] | None = None) -> OcrResult:
+    # Reads the measure number of every column after the first, or only of the given columns (in that order).
+    # With scale tiers, every column is read at the first (cheapest) scale, and only the columns that weren't read
+    # confidently are read again at each bigger scale. A read only replaces the previous one if it's more confident.
+    roi_cache = RoiCache(roi_cache_path) if roi_cache_path is not None else None
+    if column_nums is None:
+        column_nums = list(range(1, get_column_count(img, geometry)))
+    scale_tiers = geometry.ocr_scale_tiers or [geometry.ocr_scale_multiplier]
+
+    result = read_measure_numbers(extract_measure_rois(img, geometry, scale_tiers[0], column_nums), ocr_backend,
+                                  templates, scale_tiers[0], roi_cache)
+    for resize_value in scale_tiers[1:]:
+        doubtful = [i for i, (conf, is_blank) in enumerate(zip(result.confidences, result.blank))
+                    if not is_blank and conf < OCR_MIN_BOX_CONFIDENCE]
+        if not doubtful:
+            break
+        tier_result = read_measure_numbers(
+            extract_measure_rois(img, geometry, resize_value, [column_nums[i] for i in doubtful]), ocr_backend,
+            templates, resize_value, roi_cache)
+        for i, measure_number, conf in zip(doubtful, tier_result.measure_numbers, tier_result.confidences):
+            if conf > result.confidences[i]:
+                result.measure_numbers[i] = measure_number
+                result.confidences[i] = conf
+        result.escalated_columns += len(doubtful)
+        result.cache_hits += tier_result.cache_hits
+        result.cache_misses += tier_result.cache_misses
+    return result
+
+
+def crop_chart(image: SharedImage, spacing_px: int, start_column: int, end_column: int,
+               options: ClipOptions) -> bytes:
+    # Crops the columns out of the chart and encodes them, without ever touching the disk.
+    with AttachedImage(image) as attached:
+        return crop_image(attached.array, spacing_px, start_column, end_column, options)
+
+
+def crop_image(img: numpy.ndarray, spacing_px: int, start_column: int, end_column: int,
+               options: ClipOptions) -> bytes:
+    h, w, c = img.shape
+    crop_x_start = spacing_px * start_column
+    crop_x_end = spacing_px * end_column
+    crop = img[0:h, crop_x_start:crop_x_end]
+    return encode_clip(crop, spacing_px, options)
+
+
+def wrap_columns(crop: numpy.ndarray, spacing_px: int, columns_per_row: int) -> numpy.ndarray:
+    # Stacks a long clip into rows of at most columns_per_row columns, read left to right and then top to bottom.
+    # The columns are spread as evenly as possible over the rows, so the last row isn't left nearly empty.
+    column_count = math.ceil(crop.shape[1] / spacing_px)
+    if column_count <= columns_per_row:
+        return crop
+    row_count = math.ceil(column_count / columns_per_row)
+    row_width = spacing_px * math.ceil(column_count / row_count)
+    rows = []
+    for x in range(0, crop.shape[1], row_width):
+        row = crop[:, x:x + row_width]
+        rows.append(cv2.copyMakeBorder(row, 0, CLIP_ROW_GAP_PX, 0, row_width - row.shape[1], cv2.BORDER_CONSTANT,
+                                       value=CLIP_BACKGROUND_COLOR))
+    return numpy.vstack(rows)[:-CLIP_ROW_GAP_PX]
+
+
+def encode_clip(crop: numpy.ndarray, spacing_px: int, options: ClipOptions) -> bytes:
+    # Lays out and encodes a clip (see ClipOptions). Discord downscales anything bigger than its preview size anyway
+    # and rejects uploads over its size limit, so clips are scaled down to fit both.
+    if options.columns_per_row is not None:
+        crop = wrap_columns(crop, spacing_px, options.columns_per_row)
+    scale = min(1.0, CLIP_MAX_DIMENSION_PX / max(crop.shape[:2]))
+    while True:
+        resized = crop if scale >= 1 else cv2.resize(crop, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        encoded = encode_within_budget(resized, options.encodings, options.max_bytes)
+        if len(encoded) <= CLIP_MAX_BYTES:
+            return encoded
+        # The encoded size goes down with the pixel count, so shrink by a bit more than the square root.
+        scale *= 0.9 * math.sqrt(CLIP_MAX_BYTES / len(encoded))
+
+
+def save_decoded_chart(image: SharedImage, path: str):
+    # Saves the decoded pixels of the chart as a .npy file, which crop_decoded_chart() can memory map. Written to a
+    # temporary file that's renamed into place, so a half-written file is never mapped.
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with AttachedImage(image) as attached, open(temp_path, "wb") as handler:
+        numpy.save(handler, attached.array)
+    os.replace(temp_path, path)
+
+
+def crop_decoded_chart(path: str, spacing_px: int, start_column: int, end_column: int,
+                       options: ClipOptions) -> bytes:
+    # Crops a chart saved by save_decoded_chart(). Nothing gets decoded, only the pages under the clip are read, and
+    # those are shared with every other worker through the page cache.
+    return crop_image(numpy.load(path, mmap_mode="r"), spacing_px, start_column, end_column, options)
+
+
+def split_chart(image: SharedImage, spacing_px: int, tile_folder: str) -> int:
+    # Saves every column of the chart as its own PNG, so clips can later be put together from just the columns they
+    # need. The tiles are written to a temporary folder that's renamed into place, so a half-written set is never
+    # used. Returns the number of tiles.
+    with AttachedImage(image) as attached:
+        img = attached.array
+        column_count = math.ceil(img.shape[1] / spacing_px)
+        temp_folder = f"{tile_folder.rstrip('/')}.{os.getpid()}.tmp"
+        os.makedirs(temp_folder, exist_ok=True)
+        for column_num in range(column_count):
+            tile = img[:, spacing_px * column_num:spacing_px * (column_num + 1)]
+            with open(f"{temp_folder}/{column_num:04d}.png", "wb") as handler:
+                handler.write(cv2.imencode(".png", tile)[1].tobytes())
+    try:
+        os.rename(temp_folder, tile_folder.rstrip("/"))
+    except OSError:
+        # Someone else split the same chart first.
+        shutil.rmtree(temp_folder, ignore_errors=True)
+    return column_count
+
+
+def crop_tiles(tile_folder: str, spacing_px: int, start_column: int, end_column: int,
+               options: ClipOptions) -> bytes:
+    # Puts a clip together out of the tiles of its columns, so only those columns are ever decoded. Columns past
+    # the end of the chart are left out, the same as cropping the whole image would.
+    tiles = [cv2.imread(path) for path in (f"{tile_folder}{column_num:04d}.png"
+                                           for column_num in range(start_column, end_column)) if os.path.isfile(path)]
+    return encode_clip(cv2.hconcat(tiles), spacing_px, options)
+
+
+def build_templates(charts: list[tuple[str, dict[int, int], FncGeometry]]) -> numpy.ndarray | None:
+    # Builds the digit templates out of charts whose measures are already known. Charts whose image has gone missing
+    # or can't be decoded are skipped.
+    samples: list[tuple[numpy.ndarray, int]] = []
+    for image_path, measures, geometry in charts:
+        image = cv2.imread(image_path)
+        if image is None:
+            logging.warning(f"Skipping unreadable chart image {image_path} while building digit templates.")
+            continue
+        rois = extract_measure_rois(image, geometry)
+        samples.extend((roi, measures[column_num]) for column_num, roi in enumerate(rois, start=1)
+                       if column_num in measures)
+    logging.warning(f"Building digit templates from {len(samples)} measure numbers.")
+    return build_digit_templates(samples)
+
+
+class RenderService:
+    def __init__(self, max_workers: int = RENDER_WORKERS, max_queue_depth: int = RENDER_QUEUE_DEPTH):
+        """
+        Runs the CPU-heavy parts of chart rendering (decoding, OCR, cropping) in a pool of worker processes so the
+        Discord event loop only ever waits on the results. The workers are long-lived and each one keeps a
+        Tesseract engine loaded, so OCR jobs only pay for recognition. Workers that die or hang are replaced.
+
+        max_workers - The number of worker processes.
+        max_queue_depth - The number of jobs that can be running or waiting at once. Anything past this is
+            rejected with a RenderQueueFullError instead of piling up behind work that will take minutes.
+        """
+        self.max_workers = max_workers
+        self.max_queue_depth = max_queue_depth
+        self.pending_jobs = 0
+        self.health_check_task = None
+        self.job_ids = itertools.count(1)
+        self.executor = self.create_executor()
+
+    def create_executor(self) -> RenderPool:
+        return RenderPool(self.max_workers)
+
+    def respawn(self):
+        # Throws away the current workers (killing any that are stuck) and starts a fresh pool.
+        logging.warning("Respawning render workers.")
+        old_executor = self.executor
+        self.executor = self.create_executor()
+        # ProcessPoolExecutor has no public way to kill its workers, and shutdown() waits on hung ones forever.
+        for process in list((old_executor._processes or {}).values()):
+            process.terminate()
+        old_executor.shutdown(wait=False, cancel_futures=True)
+
+    async def submit(self, fn, *args, release=None):
+        # Runs a job in a worker process. If the caller is cancelled while waiting (for example, because the
+        # interaction expired), a job that hasn't started yet is cancelled along with it. Jobs whose result holds on
+        # to something (like shared memory) pass a release function, which gets the result if nobody is left to
+        # take it.
+        # If a worker dies, the pool is respawned. Jobs that were still waiting their turn are sent to the new pool.
+        # Jobs that were running at the time may be what killed it, and sending one back would just kill the new
+        # pool too, along with everyone else's jobs. So each of those is retried once in a worker of its own instead:
+        # if it was only caught up in it, it succeeds, and if it wasn't, it fails on its own.
+        if self.pending_jobs >= self.max_queue_depth:
+            raise RenderQueueFullError(f"Render queue is full ({self.pending_jobs} jobs pending).")
+
+        self.pending_jobs += 1
+        try:
+            if self.executor._broken:
+                self.respawn()
+            pool = self.executor
+            job_id = next(self.job_ids)
+            try:
+                return await self.wait_for_job(pool.submit(run_job, job_id, fn, *args), release)
+            except BrokenProcessPool:
+                if pool is self.executor:
+                    self.respawn()
+                if not pool.was_running(job_id):
+                    logging.warning(f"A render worker died while {fn.__name__} was waiting, retrying.")
+                    return await self.wait_for_job(self.executor.submit(run_job, job_id, fn, *args), release)
+                logging.warning(f"A render worker died while {fn.__name__} was running, retrying it on its own.")
+                return await self.run_isolated(job_id, fn, *args, release=release)
+        finally:
+            self.pending_jobs -= 1
+
+    async def run_isolated(self, job_id: int, fn, *args, release=None):
+        # Runs a job in a pool of its own, so if it kills its worker, nothing else goes down with it.
+        pool = RenderPool(1)
+        try:
+            return await self.wait_for_job(pool.submit(run_job, job_id, fn, *args), release)
+        except BrokenProcessPool as e:
+            raise RenderWorkerCrashedError(f"{fn.__name__} killed its render worker, even on its own.") from e
+        finally:
+            pool.shutdown(wait=False)
+
+    @staticmethod
+    async def wait_for_job(future: concurrent.futures.Future, release=None):
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            if release is not None:
+                future.add_done_callback(
+                    lambda done: release(done.result()) if not done.cancelled() and done.exception() is None else None)
+            raise
+
+    async def check_health(self) -> bool:
+        # Makes sure the workers still answer. Skipped while every worker is busy, since the check would just
+        # wait in line behind real work and look like a hang.
+        if self.pending_jobs >= self.max_workers:
+            return True
+        try:
+            pid, engine_loaded = await asyncio.wait_for(asyncio.wrap_future(self.executor.submit(ping)),
+                                                        timeout=RENDER_HEALTH_CHECK_TIMEOUT)
+            if not engine_loaded:
+                logging.warning(f"Render worker {pid} is running without a loaded Tesseract engine.")
+            return True
+        except (BrokenProcessPool, asyncio.TimeoutError):
+            logging.warning("Render workers failed their health check.")
+            self.respawn()
+            return False
+
+    async def monitor_health(self):
+        while True:
+            await asyncio.sleep(RENDER_HEALTH_CHECK_INTERVAL)
+            await self.check_health()
+
+    def start_health_checks(self):
+        if self.health_check_task is None or self.health_check_task.done():
+            self.health_check_task = asyncio.create_task(self.monitor_health())
+
+    def shutdown(self):
+        if self.health_check_task is not None:
+            self.health_check_task.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
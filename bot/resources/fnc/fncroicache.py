@@ -0,0 +1,60 @@
+import hashlib
+import time
+
+import numpy
+
+from bot.resources.fnc.fncconstants import ROI_CACHE_MAX_ENTRIES
+from bot.utils.sqliteutils import connect
+
+# One connection per database per process. The render workers each open their own.
+CONNECTIONS = {}
+
+
+def get_roi_key(roi: numpy.ndarray) -> str:
+    # Hashes the binarized pixels (and shape) of a ROI. The same site renders the same number identically on every
+    # chart, so this identifies a rendering of a measure number.
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(numpy.array(roi.shape, dtype=numpy.int32).tobytes())
+    digest.update(numpy.ascontiguousarray(roi).tobytes())
+    return digest.hexdigest()
+
+
+class RoiCache:
+    def __init__(self, db_path: str, max_entries: int = ROI_CACHE_MAX_ENTRIES):
+        """
+        A persistent cache of ROI pixel hashes to the measure number that was read from them, so a given rendering
+        of a number only ever has to be OCR'd once per game. Once the cache holds more than max_entries, the least
+        recently used entries are evicted.
+        """
+        self.max_entries = max_entries
+        if db_path not in CONNECTIONS:
+            connection = connect(db_path)
+            connection.execute("CREATE TABLE IF NOT EXISTS roi_cache (key TEXT PRIMARY KEY, measure_number INTEGER, "
+                               "confidence REAL, last_used REAL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS roi_cache_last_used ON roi_cache (last_used)")
+            CONNECTIONS[db_path] = connection
+        self.connection = CONNECTIONS[db_path]
+
+    def get_many(self, keys: list[str]) -> dict[str, tuple[int, float]]:
+        if not keys:
+            return {}
+        placeholders = ",".join("?" * len(keys))
+        rows = self.connection.execute(f"SELECT key, measure_number, confidence FROM roi_cache "
+                                       f"WHERE key IN ({placeholders})", keys).fetchall()
+        if rows:
+            self.connection.execute(f"UPDATE roi_cache SET last_used = ? WHERE key IN ({placeholders})",
+                                    [time.time(), *keys])
+        return {key: (measure_number, confidence) for key, measure_number, confidence in rows}
+
+    def put_many(self, entries: dict[str, tuple[int, float]]):
+        if not entries:
+            return
+        now = time.time()
+        with self.connection:
+            self.connection.execute("BEGIN")
+            self.connection.executemany("INSERT OR REPLACE INTO roi_cache VALUES (?, ?, ?, ?)",
+                                        [(key, number, conf, now) for key, (number, conf) in entries.items()])
+            overflow = self.connection.execute("SELECT COUNT(*) FROM roi_cache").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                self.connection.execute("DELETE FROM roi_cache WHERE key IN "
+                                        "(SELECT key FROM roi_cache ORDER BY last_used LIMIT ?)", (overflow,))
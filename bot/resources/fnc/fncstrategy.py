@@ -1,22 +1,56 @@
+import asyncio
+import io
 import logging
+import os
 import re
-import cv2
+import shutil
+import time
 import discord
 import numpy
-import pytesseract
 from abc import ABC, abstractmethod
 from discord import Embed
+from msgspec import Struct
 from unidecode import unidecode
 
-from bot.resources.fnc.fncconstants import SONG_DATA_FOLDER, OUTPUT_FILE_NAME, DEFAULT_BARCLIP, BARCLIP_REGEX
-
-pytesseract.pytesseract.tesseract_cmd = r'/usr/bin/tesseract'
+from bot.resources.fnc.fncconstants import SONG_DATA_FOLDER, DEFAULT_BARCLIP, BARCLIP_REGEX, \
+    TEMPLATE_FILE_NAME, TEMPLATE_MAX_CHARTS, OCR_MIN_BOX_CONFIDENCE, ROI_CACHE_FILE_NAME, MEASURE_MIN_CONFIDENCE, \
+    CLIP_URL_EXPIRY_MARGIN, CLIP_URL_CHECK_TIMEOUT, TILE_FOLDER_SUFFIX, CLIP_MAX_BYTES, IMAGE_REVALIDATE_INTERVAL, \
+    CHART_UNAVAILABLE_TTL, CHART_UPSTREAM_ERROR_TTL
+from bot.resources.fnc.fncclipcache import ClipCache
+from bot.resources.fnc.fnchotcharts import HotChartStore
+from bot.resources.fnc.fncimageindex import ImageIndex
+from bot.resources.fnc.fncimage import SharedImage, decode_image, release_image
+from bot.resources.fnc.fncmeasureindex import MeasureIndex
+from bot.resources.fnc.fncmeasures import repair_measures
+from bot.resources.fnc.fncencode import get_file_extension
+from bot.resources.fnc.fncmodels import FncGeometry, ClipOptions
+from bot.resources.fnc.fncrender import RenderService, RenderQueueFullError, build_templates, crop_chart, ocr_chart, \
+    split_chart, crop_tiles, save_decoded_chart, crop_decoded_chart
+from bot.resources.fnc.fnctemplates import load_digit_templates, save_digit_templates, get_missing_digits
+from bot.resources.models.enums import OcrBackend, ClipEncoding
+from bot.utils import asyncutils, fileutils, metricsutils
+from bot.utils.httputils import HttpClient, HttpError, HttpResponse
+
+
+class ChartUnavailableError(Exception):
+    # Raised when the chart image can't be gotten from the site, either right now or (recently) at all.
+    pass
+
+
+class DownloadedChart(Struct):
+    # A chart image that was just downloaded, shared by every request that waited on the download. It's saved to
+    # the drive by whichever of them decodes it first.
+    response: HttpResponse
+    saved: bool = False
 
 
 class FncStrategy(ABC):
     @abstractmethod
     def __init__(self, x1_left_px, x2_left_px, y1_bottom_px, y2_bottom_px, spacing_px, doubles_spacing_px,
-                 bottom_cutoff_px, ocr_scale_multiplier, measure_oob_tol, game_title):
+                 bottom_cutoff_px, ocr_scale_multiplier, measure_oob_tol, game_title,
+                 ocr_backend=OcrBackend.TESSERACT_BATCHED, render_service=None, ocr_min_scale_multiplier=None,
+                 column_tiles=False, max_columns_per_row=None, clip_encodings=None, clip_max_bytes=CLIP_MAX_BYTES,
+                 http_client=None):
         """
         Notes:
         x1_left_px - The number, in pixels, from the top left corner of the ROI (Region of Interest)
@@ -29,11 +63,30 @@ class FncStrategy(ABC):
             to the BOTTOM side of the image.
         ocr_scale_multiplier - The multiplier of how much the image should be scaled by to get better
             readability for the numbers. NOTE: A bigger number means the process may take longer.
+        ocr_min_scale_multiplier - If set, every number is read at this multiplier first, and only the ones that
+            couldn't be read confidently are read again at each bigger multiplier, up to ocr_scale_multiplier.
+            Easy charts don't pay for the big scale, and hard ones still get it where it's needed.
         spacing_px - The number, in pixels, between each number.
-        measure_oob_tol - The number in which the change in difference between measures is too substantial,
-            and will be recalculated using (the last measure number + the average difference).
+        measure_oob_tol - The number in which a measure number is too far off from the measure numbers around it,
+            and will be recalculated from its neighbours instead.
         game_title - The name of the game. This will be used to create a specialized folder to store
             chart images as well as their measure information.
+        ocr_backend - How the measure numbers should be read. TESSERACT_BATCHED reads every column with a
+            single Tesseract call, TESSERACT reads each column with its own call, and TEMPLATE matches digits
+            against templates built from previously read charts (falling back to TESSERACT_BATCHED).
+        render_service - The RenderService that OCR and cropping jobs are sent to. This should be shared between
+            strategies so the worker and queue limits apply to the whole bot.
+        column_tiles - If True, each chart is also saved as one tile per column the first time it's loaded, and
+            clips are put together from just the tiles they need. Cropping then costs the same for a long chart as a
+            short one, which matters most for wide charts like DDR doubles.
+        max_columns_per_row - If set, clips longer than this many columns are wrapped into several rows instead of
+            one very wide strip, which Discord would downscale until it can't be read.
+        clip_encodings - The encodings clips can be sent as, in order of preference. The first one that fits in
+            clip_max_bytes is used, or the smallest one if none of them do (see ClipEncoding). Defaults to PNG.
+        clip_max_bytes - The size clips should be kept under. Clips are never scaled down to fit this, only to fit
+            Discord's own limits, so going over it just means the smallest encoding is used.
+        http_client - The HttpClient chart images are downloaded with. Like render_service, this should be shared
+            between strategies so connections are pooled for the whole bot.
         """
         self.x1_left_px = x1_left_px
         self.x2_left_px = x2_left_px
@@ -43,12 +96,48 @@ class FncStrategy(ABC):
         self.doubles_spacing_px = doubles_spacing_px
         self.bottom_cutoff_px = bottom_cutoff_px
         self.ocr_scale_multiplier = ocr_scale_multiplier
+        self.ocr_min_scale_multiplier = ocr_min_scale_multiplier
         self.measure_oob_tol = measure_oob_tol
         self.game_title = game_title
+        self.ocr_backend = ocr_backend
+        self.render_service = render_service or RenderService()
+        self.http_client = http_client or HttpClient()
+        self.column_tiles = column_tiles
+        self.clip_options = ClipOptions(columns_per_row=max_columns_per_row,
+                                        encodings=clip_encodings or [ClipEncoding.PNG], max_bytes=clip_max_bytes)
+        self.digit_templates = None
+        # Set when charts have been read since templates missing some digits were built, since those charts may
+        # have the missing digits.
+        self.digit_templates_outdated = False
+        self.measure_index = None
+        self.clip_cache = None
+        self.hot_chart_store = None
+        self.image_index = None
+        # Chart filename to when it can be tried again, and why it failed, for charts that couldn't be downloaded.
+        self.unavailable_charts: dict[str, tuple[float, str]] = {}
+        self.download_flights = asyncutils.SingleFlight(f"{game_title}.downloads")
+        self.measure_flights = asyncutils.SingleFlight(f"{game_title}.measure_reads")
+        self.clip_flights = asyncutils.SingleFlight(f"{game_title}.clip_renders")
+        self.template_flights = asyncutils.SingleFlight(f"{game_title}.template_builds")
 
     @abstractmethod
     async def execute_strategy(self, ctx, **kwargs):
-        # Execute the strategy that will take the user's input and create the bot message.
+        # Execute the strategy that will take the user's input and create the bot message. The interaction can only
+        # be followed up on until it expires, so any rendering still going on past that point gets cancelled.
+        try:
+            timeout = (ctx.expires_at - discord.utils.utcnow()).total_seconds()
+            await asyncio.wait_for(self.send_chart(ctx, **kwargs), timeout=timeout)
+        except asyncio.TimeoutError:
+            logging.warning(f"Interaction expired before the chart could be sent, cancelled rendering. "
+                            f"Song: {kwargs['song']}.")
+        except RenderQueueFullError:
+            logging.warning(f"Render queue is full, rejected chart request. Song: {kwargs['song']}.")
+            await ctx.followup.send("Too many charts are being made right now, try again in a bit!", ephemeral=True)
+        except ChartUnavailableError as e:
+            logging.warning(f"Chart image is unavailable, rejected chart request. Song: {kwargs['song']}. {e}")
+            await ctx.followup.send("Couldn't get that chart from the site, try again later!", ephemeral=True)
+
+    async def send_chart(self, ctx, **kwargs):
         song = kwargs["song"]
         difficulty = kwargs["difficulty"]
         bar_clip = kwargs["bar_clip"]
@@ -58,25 +147,146 @@ class FncStrategy(ABC):
         selected_difficulty = await self.get_difficulty(song=selected_song, difficulty=difficulty)
         bar_start, bar_end = await self.get_barclip(bar_clip)
         chart_url = await self.get_song_url(song=selected_song, difficulty=selected_difficulty)
-        local_file_path = await self.download_image_file(song=selected_song, difficulty=selected_difficulty)
         use_doubles = await self.use_doubles_spacing(song=selected_song, difficulty=selected_difficulty)
-
-        measure_numbers: dict[int, int]
-        if await self.measure_file_exists(song=selected_song, difficulty=selected_difficulty):
-            measure_numbers = await self.get_measure_numbers_from_file(song=selected_song,
-                                                                       difficulty=selected_difficulty)
-        else:
-            measure_numbers = await self.get_measure_numbers_from_image(local_file_path, use_doubles)
-            measure_numbers = await self.adjust_measures(measure_numbers)
-            await self.save_measure_numbers_to_file(measure_numbers, song=selected_song,
-                                                    difficulty=selected_difficulty)
-
-        start_column, end_column = await self.get_columns_from_barclip(measure_numbers, bar_start, bar_end)
-        cropped_image_path = await self.crop_image(local_file_path, start_column, end_column, use_doubles)
-        embed = await self.create_embed(cropped_image_path, chart_url, song=selected_song,
+        chart_filename = await self.map_chart_filename(song=selected_song, difficulty=selected_difficulty)
+        await asyncio.to_thread(self.get_hot_chart_store().record_request, chart_filename)
+        await self.schedule_revalidation(chart_filename, song=selected_song, difficulty=selected_difficulty)
+
+        # Requests for the same bars of the same chart that come in while it's being made share the one clip.
+        clip_key, clip_url, cropped_image = await self.clip_flights.do(
+            (chart_filename, bar_start, bar_end), self.render_clip, chart_filename, bar_start, bar_end, use_doubles,
+            song=selected_song, difficulty=selected_difficulty)
+
+        # Each reply gets its own attachment, named after what's in it, so nothing is shared between requests.
+        extension = get_file_extension(cropped_image) if cropped_image is not None else "png"
+        attachment_filename = f"{chart_filename}-{bar_start}-{bar_end}.{extension}"
+        embed = await self.create_embed(attachment_filename, chart_url, song=selected_song,
                                         difficulty=selected_difficulty)
-        image_file = discord.File(cropped_image_path)
-        await ctx.followup.send(embed=embed, file=image_file)
+        if clip_url is not None:
+            embed.set_image(url=clip_url)
+            await ctx.followup.send(embed=embed)
+        else:
+            image_file = discord.File(io.BytesIO(cropped_image), filename=attachment_filename)
+            message = await ctx.followup.send(embed=embed, file=image_file)
+            if message is not None and message.attachments:
+                await asyncio.to_thread(self.get_clip_cache().put_url, chart_filename, clip_key,
+                                        message.attachments[0].url)
+
+    async def render_clip(self, chart_filename: str, bar_start: str, bar_end: str, use_doubles: bool,
+                          **kwargs) -> tuple[str, str | None, bytes | None]:
+        # Gets the clip of the bars, as the CDN URL it was uploaded to before if there is one, or as the clip itself.
+        # Returns the clip's cache key, the URL and the clip.
+        song = kwargs["song"]
+        difficulty = kwargs["difficulty"]
+
+        # If these bars of the chart have been sent before, the clip is sent again as is, without the chart image
+        # being loaded at all - or, if its upload is still on Discord's CDN, just linked to. The version is read
+        # before the measures, so a clip can never be saved under a newer version than the measures it was made with.
+        measures_version = await asyncio.to_thread(self.get_measure_index().get_updated, chart_filename)
+        measure_numbers: dict[int, int] | None = None
+        clip_key: str | None = None
+        clip_url: str | None = None
+        cropped_image: bytes | None = None
+        if measures_version is not None:
+            measure_numbers = await self.get_measure_numbers_from_file(song=song, difficulty=difficulty)
+            start_column, end_column = await self.get_columns_from_barclip(measure_numbers, bar_start, bar_end)
+            clip_key = ClipCache.get_key(chart_filename, start_column, end_column, use_doubles,
+                                         self.clip_options, measures_version)
+            clip_url = await self.get_clip_url(clip_key)
+            if clip_url is None:
+                cropped_image = await asyncio.to_thread(self.get_clip_cache().get, chart_filename, clip_key)
+        metricsutils.increment(f"{self.game_title}.clip_cache_hits", clip_url is not None or cropped_image is not None)
+        metricsutils.increment(f"{self.game_title}.clip_cache_lookups")
+        metricsutils.increment(f"{self.game_title}.clip_url_reuses", clip_url is not None)
+
+        image: SharedImage | None = None
+        try:
+            if clip_url is None and cropped_image is None:
+                tile_folder = await self.get_tile_folder(song=song, difficulty=difficulty)
+                if measure_numbers is not None and \
+                        await asyncio.to_thread(self.get_hot_chart_store().is_hot, chart_filename):
+                    # The chart's decoded pixels are memory mapped, so nothing gets decoded at all.
+                    cropped_image = await self.crop_hot_chart(chart_filename, start_column, end_column, use_doubles)
+                elif measure_numbers is not None and self.column_tiles and os.path.isdir(tile_folder):
+                    # Only the tiles of the clip's columns get decoded, not the whole chart.
+                    cropped_image = await self.crop_tiles(tile_folder, start_column, end_column, use_doubles)
+                if cropped_image is None:
+                    # The image is decoded once, and OCR and cropping both work off of that same copy in shared memory.
+                    image = await self.get_decoded_image(song=song, difficulty=difficulty)
+                    await asyncio.to_thread(self.get_hot_chart_store().record_size, chart_filename,
+                                            int(numpy.prod(image.shape)))
+                    if measure_numbers is None:
+                        # Clips of other bars of the chart may be waiting on the same measures.
+                        measures_version, measure_numbers = await self.measure_flights.do(
+                            chart_filename, self.read_measures, image, use_doubles, song=song, difficulty=difficulty)
+                        start_column, end_column = await self.get_columns_from_barclip(measure_numbers, bar_start,
+                                                                                       bar_end)
+                        clip_key = ClipCache.get_key(chart_filename, start_column, end_column, use_doubles,
+                                                     self.clip_options, measures_version)
+                    cropped_image = await self.crop_image(image, start_column, end_column, use_doubles)
+                logging.warning(f"Rendered clip {clip_key}: {len(cropped_image) / 1024:.0f}KB.")
+                metricsutils.increment(f"{self.game_title}.clips_rendered")
+                metricsutils.increment(f"{self.game_title}.clip_bytes", len(cropped_image))
+                await asyncio.to_thread(self.get_clip_cache().put, chart_filename, clip_key, cropped_image)
+        except BaseException:
+            if image is not None:
+                asyncutils.run_in_background(self.release_decoded_image(image, chart_filename))
+            raise
+
+        # The chart is split into tiles and possibly made hot in the background, so nobody waits on it. The image
+        # goes with it, and is released once that's done.
+        asyncutils.run_in_background(self.prepare_chart(image, chart_filename, use_doubles, song=song,
+                                                        difficulty=difficulty))
+        return clip_key, clip_url, cropped_image
+
+    async def read_measures(self, image: SharedImage, use_doubles: bool, **kwargs) -> tuple[float, dict[int, int]]:
+        # Reads, repairs and saves the measures of the chart. Returns the version they were saved as, and the measures.
+        measure_numbers, confidences = await self.get_measure_numbers_from_image(image, use_doubles)
+        measure_numbers, confidences = await self.adjust_measures(measure_numbers, confidences)
+        measures_version = await self.save_measure_numbers_to_file(measure_numbers, song=kwargs["song"],
+                                                                   difficulty=kwargs["difficulty"],
+                                                                   confidences=confidences)
+        if self.digit_templates is not None and get_missing_digits(self.digit_templates):
+            self.digit_templates_outdated = True
+        return measures_version, measure_numbers
+
+    async def prepare_chart(self, image: SharedImage | None, chart_filename: str, use_doubles: bool, **kwargs):
+        # Gets the chart ready for later requests. Both steps can be done by a later request just as well, so
+        # they're skipped when the workers are busy.
+        try:
+            if image is not None and self.column_tiles:
+                await self.save_column_tiles(image, use_doubles, song=kwargs["song"], difficulty=kwargs["difficulty"])
+            await self.promote_hot_chart(image, chart_filename, song=kwargs["song"], difficulty=kwargs["difficulty"])
+        except RenderQueueFullError:
+            logging.warning(f"Render queue is full, skipped preparing {chart_filename} for later requests.")
+        finally:
+            if image is not None:
+                await self.release_decoded_image(image, chart_filename)
+
+    async def release_decoded_image(self, image: SharedImage, chart_filename: str):
+        # The chart's measures may still be being read off of the image for other requests that joined in after the
+        # one that decoded it had given up, so it's only released once that's finished.
+        measures_task = self.measure_flights.get(chart_filename)
+        if measures_task is not None:
+            await asyncio.wait([measures_task])
+        release_image(image)
+
+    async def get_clip_url(self, clip_key: str) -> str | None:
+        # Gets the CDN URL a clip was uploaded to before, if it's still good. URLs that are about to expire, or that
+        # the CDN doesn't serve anymore (the message was deleted, for example), are forgotten.
+        row = await asyncio.to_thread(self.get_clip_cache().get_url, clip_key)
+        if row is None:
+            return None
+        url, expires = row
+        if expires is None or expires - time.time() > CLIP_URL_EXPIRY_MARGIN:
+            try:
+                response = await self.http_client.head(url, timeout=CLIP_URL_CHECK_TIMEOUT)
+                if response.ok:
+                    return url
+            except HttpError as e:
+                logging.warning(f"Failed to check clip URL {url}. Error: {e}.")
+        await asyncio.to_thread(self.get_clip_cache().remove_url, clip_key)
+        return None
 
     @abstractmethod
     async def map_chart_name(self, **kwargs) -> str:
@@ -98,11 +308,225 @@ class FncStrategy(ABC):
         raise NotImplementedError
 
     @abstractmethod
-    async def download_image_file(self, **kwargs):
-        # Downloads the image file locally, and merges images before saving if necessary. The implementation
-        # will depend on the strategy since this process can differ.
+    async def download_image(self, **kwargs) -> HttpResponse:
+        # Downloads the chart image, and merges images if necessary. The implementation will depend on the strategy
+        # since this process can differ. If headers are given (conditional request headers, for example), they're
+        # sent with the image request.
         raise NotImplementedError
 
+    @abstractmethod
+    async def get_local_image_path(self, **kwargs) -> str:
+        # Gets where the chart image is cached on the drive.
+        raise NotImplementedError
+
+    async def download_chart(self, local_image_path: str, **kwargs) -> DownloadedChart:
+        # Charts that just failed to download fail straight away, without asking the site again until it's been a
+        # while. The response is only checked as far as it can be without decoding it, the rest is checked by
+        # decode_download() as it's decoded.
+        chart_filename = await self.map_chart_filename(song=kwargs["song"], difficulty=kwargs["difficulty"])
+        retry_at, reason = self.unavailable_charts.get(chart_filename, (0, None))
+        if time.monotonic() < retry_at:
+            metricsutils.increment(f"{self.game_title}.unavailable_chart_hits")
+            raise ChartUnavailableError(f"{chart_filename} failed recently: {reason}")
+        try:
+            response = await self.download_image(song=kwargs["song"], difficulty=kwargs["difficulty"])
+        except HttpError as e:
+            self.mark_chart_unavailable(chart_filename, CHART_UPSTREAM_ERROR_TTL, str(e))
+            raise ChartUnavailableError(f"{chart_filename} couldn't be downloaded: {e}") from e
+        reason = self.get_invalid_response_reason(response)
+        if reason is not None:
+            # Server errors are likely to clear up soon, anything else (a 404, an error page) likely won't.
+            self.mark_chart_unavailable(chart_filename, CHART_UPSTREAM_ERROR_TTL if response.status >= 500
+                                        else CHART_UNAVAILABLE_TTL, reason)
+            raise ChartUnavailableError(f"{chart_filename} couldn't be downloaded: {reason}")
+        return DownloadedChart(response=response)
+
+    async def decode_download(self, download: DownloadedChart, local_image_path: str, **kwargs) -> SharedImage:
+        # Decodes a downloaded chart image, which also checks that it is one. Anything that isn't a chart image is
+        # never written to the drive. Every request that waited on the same download decodes its own copy, and
+        # the first one to finish saves it.
+        chart_filename = await self.map_chart_filename(song=kwargs["song"], difficulty=kwargs["difficulty"])
+        response = download.response
+        try:
+            image = await self.decode_image(response.content, await self.use_doubles_spacing(
+                song=kwargs["song"], difficulty=kwargs["difficulty"]))
+        except ValueError as e:
+            reason = f"Got something that isn't a chart image from {response.url}. {e}"
+            self.mark_chart_unavailable(chart_filename, CHART_UNAVAILABLE_TTL, reason)
+            raise ChartUnavailableError(f"{chart_filename} couldn't be downloaded: {reason}") from e
+        if not download.saved:
+            download.saved = True
+            self.unavailable_charts.pop(chart_filename, None)
+            # Written to a temporary file and renamed into place, so a crash never leaves half a chart behind.
+            fileutils.write_behind(local_image_path, response.content)
+            # The chart may have changed since any clips, tiles or hot copies of it were made.
+            await self.invalidate_chart(response, song=kwargs["song"], difficulty=kwargs["difficulty"])
+        return image
+
+    def get_invalid_response_reason(self, response: HttpResponse) -> str | None:
+        # Checks the parts of a response that can be checked without decoding it. Returns why it isn't a chart
+        # image, or None if it could be one.
+        if not response.ok:
+            return f"Status {response.status} from {response.url}."
+        if response.headers.get("content-type", "").startswith("text/"):
+            return f"Got {response.headers['content-type']} instead of an image from {response.url}."
+        return None
+
+    def mark_chart_unavailable(self, chart_filename: str, ttl: float, reason: str):
+        logging.warning(f"Chart {chart_filename} is unavailable for {ttl}s. {reason}")
+        metricsutils.increment(f"{self.game_title}.unavailable_charts")
+        self.unavailable_charts[chart_filename] = (time.monotonic() + ttl, reason)
+        # Expired entries are dropped whenever a new one is added, so this never grows past the charts that failed
+        # within the TTL.
+        now = time.monotonic()
+        for expired in [x for x, (retry_at, _) in self.unavailable_charts.items() if retry_at <= now]:
+            del self.unavailable_charts[expired]
+
+    async def schedule_revalidation(self, chart_filename: str, **kwargs):
+        # Checks the chart image against the site in the background if it's on the drive and hasn't been checked
+        # in a while. Most requests never load the image at all (their clip is cached, or comes from the tiles), so
+        # this is done for every request rather than when the image is loaded.
+        local_image_path = await self.get_local_image_path(song=kwargs["song"], difficulty=kwargs["difficulty"])
+        if os.path.isfile(local_image_path) and await asyncio.to_thread(
+                self.get_image_index().claim_revalidation, chart_filename, IMAGE_REVALIDATE_INTERVAL):
+            asyncutils.run_in_background(self.revalidate_image(local_image_path, chart_filename, song=kwargs["song"],
+                                                               difficulty=kwargs["difficulty"]))
+
+    async def revalidate_image(self, local_image_path: str, chart_filename: str, **kwargs):
+        # Asks the site whether the chart image changed since it was downloaded, with a conditional request, so an
+        # unchanged image costs a 304 instead of the whole image. If it did change, the new image replaces the old
+        # one, and everything made from the old one is thrown away.
+        etag, last_modified = await asyncio.to_thread(self.get_image_index().get_validators, chart_filename)
+        headers = {}
+        if etag is not None:
+            headers["If-None-Match"] = etag
+        if last_modified is not None:
+            headers["If-Modified-Since"] = last_modified
+        try:
+            response = await self.download_image(song=kwargs["song"], difficulty=kwargs["difficulty"],
+                                                 headers=headers)
+        except HttpError as e:
+            logging.warning(f"Failed to revalidate {local_image_path}, keeping it. Error: {e}.")
+            return
+        metricsutils.increment(f"{self.game_title}.image_revalidations")
+        image_bytes = await asyncio.to_thread(fileutils.read_file, local_image_path)
+        if response.status == 304 or (response.ok and response.content == image_bytes):
+            # Images downloaded before their headers were kept come back in full the first time. They're still
+            # the same image, and the headers are kept so the next check is a conditional one.
+            if response.status == 304:
+                metricsutils.increment(f"{self.game_title}.download_bytes_saved", len(image_bytes))
+            await asyncio.to_thread(self.get_image_index().put, chart_filename, response.headers.get("etag", etag),
+                                    response.headers.get("last-modified", last_modified))
+            return
+        reason = self.get_invalid_response_reason(response)
+        if reason is not None:
+            logging.warning(f"Failed to revalidate {local_image_path}, keeping it. {reason}")
+            return
+        try:
+            release_image(await self.decode_image(response.content, await self.use_doubles_spacing(
+                song=kwargs["song"], difficulty=kwargs["difficulty"])))
+        except ValueError as e:
+            logging.warning(f"Failed to revalidate {local_image_path}, keeping it. Got something that isn't a chart "
+                            f"image from {response.url}. {e}")
+            return
+        logging.warning(f"Chart image {local_image_path} changed on the site, replacing it.")
+        metricsutils.increment(f"{self.game_title}.image_changes")
+        # Written before anything is thrown away, so nothing gets made from the old image again. The measures may
+        # have moved too, so they're read again by the next request.
+        await asyncio.to_thread(fileutils.write_file_atomic, local_image_path, response.content)
+        await asyncio.to_thread(self.get_measure_index().remove, chart_filename)
+        await self.invalidate_chart(response, song=kwargs["song"], difficulty=kwargs["difficulty"])
+
+    async def invalidate_chart(self, response: HttpResponse, **kwargs):
+        # Throws away the clips, tiles and hot copy made from the chart's old image, and keeps the headers of the
+        # new one.
+        chart_filename = await self.map_chart_filename(song=kwargs["song"], difficulty=kwargs["difficulty"])
+        await asyncio.to_thread(self.get_image_index().put, chart_filename, response.headers.get("etag"),
+                                response.headers.get("last-modified"))
+        await asyncio.to_thread(self.get_clip_cache().invalidate, chart_filename)
+        await asyncio.to_thread(self.get_hot_chart_store().demote, chart_filename)
+        tile_folder = await self.get_tile_folder(song=kwargs["song"], difficulty=kwargs["difficulty"])
+        await asyncio.to_thread(shutil.rmtree, tile_folder, ignore_errors=True)
+
+    async def get_tile_folder(self, **kwargs) -> str:
+        # Gets where the column tiles of the chart are kept on the drive, next to the chart image.
+        chart_filename = await self.map_chart_filename(song=kwargs["song"], difficulty=kwargs["difficulty"])
+        return f"{await self.get_local_song_id_folder(song=kwargs['song'])}{chart_filename}{TILE_FOLDER_SUFFIX}/"
+
+    async def save_column_tiles(self, image: SharedImage, use_doubles_spacing: bool, **kwargs):
+        # Splits the chart into one tile per column (see fncrender.split_chart()), unless that's been done already.
+        tile_folder = await self.get_tile_folder(song=kwargs["song"], difficulty=kwargs["difficulty"])
+        if os.path.isdir(tile_folder):
+            return
+        spacing_px = self.get_geometry(use_doubles_spacing).spacing_px
+        column_count = await self.render_service.submit(split_chart, image, spacing_px, tile_folder)
+        logging.warning(f"Split image: {image.name} into {column_count} column tiles at {tile_folder}.")
+
+    async def crop_tiles(self, tile_folder: str, start_column: int, end_column: int,
+                         use_doubles_spacing: bool) -> bytes:
+        logging.warning(f"Cropping started from the column tiles at {tile_folder}.")
+        spacing_px = self.get_geometry(use_doubles_spacing).spacing_px
+        return await self.render_service.submit(crop_tiles, tile_folder, spacing_px, start_column, end_column,
+                                                self.clip_options)
+
+    async def promote_hot_chart(self, image: SharedImage | None, chart_filename: str, **kwargs):
+        # Saves the decoded chart as a hot chart if it's requested often enough (see HotChartStore). If the request
+        # didn't need the chart decoded (its clip came from the tiles), it's decoded here.
+        hot_charts = self.get_hot_chart_store()
+        evictions = await asyncio.to_thread(hot_charts.get_evictions, chart_filename)
+        if evictions is None:
+            return
+        decoded_image = image or await self.get_decoded_image(song=kwargs["song"], difficulty=kwargs["difficulty"])
+        try:
+            await self.render_service.submit(save_decoded_chart, decoded_image, hot_charts.get_path(chart_filename))
+        finally:
+            if image is None:
+                release_image(decoded_image)
+        await asyncio.to_thread(hot_charts.promote, chart_filename, evictions)
+        logging.warning(f"Promoted {chart_filename} to a hot chart. Evicted: {evictions}.")
+
+    async def crop_hot_chart(self, chart_filename: str, start_column: int, end_column: int,
+                             use_doubles_spacing: bool) -> bytes | None:
+        # Returns None if the chart stopped being hot before it could be cropped.
+        logging.warning(f"Cropping started from hot chart: {chart_filename}.")
+        spacing_px = self.get_geometry(use_doubles_spacing).spacing_px
+        try:
+            return await self.render_service.submit(crop_decoded_chart, self.get_hot_chart_store().get_path(
+                chart_filename), spacing_px, start_column, end_column, self.clip_options)
+        except FileNotFoundError:
+            return None
+
+    async def decode_image(self, image_bytes: bytes, use_doubles_spacing: bool | None = None) -> SharedImage:
+        # Decodes the image in a render worker. It has to be given to release_image() once it's no longer needed. If
+        # the chart's spacing is given, images too small to hold a column and its measure number are rejected too.
+        if use_doubles_spacing is None:
+            return await self.render_service.submit(decode_image, image_bytes, release=release_image)
+        geometry = self.get_geometry(use_doubles_spacing)
+        return await self.render_service.submit(decode_image, image_bytes, geometry.spacing_px,
+                                                max(geometry.y1_bottom_px, geometry.bottom_cutoff_px) + 1,
+                                                release=release_image)
+
+    async def get_decoded_image(self, **kwargs) -> SharedImage:
+        # Gets the chart image and decodes it, from the drive if it has been downloaded before. An image on the drive
+        # that can't be decoded (damaged on the drive, or cached before downloads were checked) is thrown away and
+        # downloaded again, instead of failing every request for the chart from then on.
+        local_image_path = await self.get_local_image_path(song=kwargs["song"], difficulty=kwargs["difficulty"])
+        if os.path.isfile(local_image_path):
+            logging.warning(f"Cached file already found, using file {local_image_path}.")
+            image_bytes = await asyncio.to_thread(fileutils.read_file, local_image_path)
+            metricsutils.increment(f"{self.game_title}.download_bytes_saved", len(image_bytes))
+            try:
+                return await self.decode_image(image_bytes)
+            except ValueError:
+                logging.warning(f"Cached file {local_image_path} couldn't be decoded, downloading it again.")
+                metricsutils.increment(f"{self.game_title}.undecodable_images")
+                await asyncio.to_thread(os.remove, local_image_path)
+        # Every request that needs the chart before it has been downloaded waits on the same download.
+        download = await self.download_flights.do(local_image_path, self.download_chart, local_image_path,
+                                                  song=kwargs["song"], difficulty=kwargs["difficulty"])
+        return await self.decode_download(download, local_image_path, song=kwargs["song"],
+                                          difficulty=kwargs["difficulty"])
+
     @abstractmethod
     async def sanitize_inputs(self, ctx, **kwargs):
         # Checks the arguments of the Discord command. The number of arguments will differ as different commands
@@ -127,21 +551,50 @@ class FncStrategy(ABC):
 
     @abstractmethod
     async def measure_file_exists(self, **kwargs) -> bool:
-        # Checks to see if measures exist from a previous run, and uses those to save time. Unfortunately, the file
-        # name may change based off of chart information, so we can't make this generic.
-        raise NotImplementedError
+        # Checks to see if measures exist from a previous run, and uses those to save time.
+        chart_filename = await self.map_chart_filename(song=kwargs["song"], difficulty=kwargs["difficulty"])
+        return await asyncio.to_thread(self.get_measure_index().contains, chart_filename)
 
     @abstractmethod
     async def get_measure_numbers_from_file(self, **kwargs) -> dict[int, int]:
-        # Gets the measures from a previously saved file. Unfortunately, the file name may change based off of
-        # chart information, so we can't make this generic.
-        raise NotImplementedError
+        # Gets the measures saved by a previous run.
+        chart_filename = await self.map_chart_filename(song=kwargs["song"], difficulty=kwargs["difficulty"])
+        return await asyncio.to_thread(self.get_measure_index().get, chart_filename)
 
     @abstractmethod
-    async def save_measure_numbers_to_file(self, measures: dict[int, int], **kwargs):
-        # Saves the measures to a file. Unfortunately, the file name may change based off of chart information,
-        # so we can't make this generic.
-        raise NotImplementedError
+    async def save_measure_numbers_to_file(self, measures: dict[int, int], **kwargs) -> float:
+        # Saves the measures to the game's measure index, along with the song folder the chart image lives in and,
+        # if they're given, how confident we are in each measure. Returns the version they were saved as. Clips
+        # made with the old measures can't be hit anymore, so they're dropped to free up the cache.
+        song = kwargs["song"]
+        chart_filename = await self.map_chart_filename(song=song, difficulty=kwargs["difficulty"])
+        song_folder = os.path.relpath(await self.get_local_song_id_folder(song=song),
+                                      f"{SONG_DATA_FOLDER}{self.game_title}")
+        version = await asyncio.to_thread(self.get_measure_index().put, chart_filename, song_folder, measures,
+                                          kwargs.get("confidences"))
+        await asyncio.to_thread(self.get_clip_cache().invalidate, chart_filename)
+        return version
+
+    def get_measure_index(self) -> MeasureIndex:
+        # Opened on first use rather than in the constructor, since opening it the first time migrates old files.
+        if self.measure_index is None:
+            self.measure_index = MeasureIndex(f"{SONG_DATA_FOLDER}{self.game_title}/")
+        return self.measure_index
+
+    def get_clip_cache(self) -> ClipCache:
+        if self.clip_cache is None:
+            self.clip_cache = ClipCache(f"{SONG_DATA_FOLDER}{self.game_title}/")
+        return self.clip_cache
+
+    def get_image_index(self) -> ImageIndex:
+        if self.image_index is None:
+            self.image_index = ImageIndex(f"{SONG_DATA_FOLDER}{self.game_title}/")
+        return self.image_index
+
+    def get_hot_chart_store(self) -> HotChartStore:
+        if self.hot_chart_store is None:
+            self.hot_chart_store = HotChartStore(f"{SONG_DATA_FOLDER}{self.game_title}/")
+        return self.hot_chart_store
 
     @abstractmethod
     async def use_doubles_spacing(self, **kwargs):
@@ -150,70 +603,150 @@ class FncStrategy(ABC):
         return False
 
     @abstractmethod
-    async def get_measure_numbers_from_image(self, file_path: str, use_doubles_spacing: bool) -> dict[int, int]:
-        # Downloads the image from a given website and merges the chart and measure numbers together (if applicable).
-        logging.warning(f"Starting to OCR file: {file_path}. Doubles spacing: {use_doubles_spacing}")
+    async def get_measure_numbers_from_image(self, image: SharedImage,
+                                             use_doubles_spacing: bool) -> tuple[dict[int, int], dict[int, float]]:
+        # Reads the measure number of every column of the chart, along with how confident the read was (0-100).
+        logging.warning(f"Starting to OCR image: {image.name}. Doubles spacing: {use_doubles_spacing}")
+        ocr_backend, templates = self.ocr_backend, None
+        if ocr_backend == OcrBackend.TEMPLATE:
+            try:
+                templates = await self.get_digit_templates()
+            except Exception as e:
+                # The templates only make OCR faster, so failing to build them shouldn't fail the request.
+                logging.warning(f"Failed to build digit templates for {self.game_title}, reading {image.name} with "
+                                f"Tesseract instead. Error: {e!r}.")
+                ocr_backend = OcrBackend.TESSERACT_BATCHED
+        result = await self.render_service.submit(ocr_chart, image, self.get_geometry(use_doubles_spacing),
+                                                  ocr_backend, templates,
+                                                  f"{SONG_DATA_FOLDER}{self.game_title}/{ROI_CACHE_FILE_NAME}")
+        metricsutils.increment(f"{self.game_title}.roi_cache_hits", result.cache_hits)
+        metricsutils.increment(f"{self.game_title}.roi_cache_lookups", result.cache_hits + result.cache_misses)
+        hit_rate = metricsutils.get_ratio(f"{self.game_title}.roi_cache_hits", f"{self.game_title}.roi_cache_lookups")
+        low_confidence = [column_num for column_num, conf in enumerate(result.confidences, start=1)
+                          if 0 < conf < OCR_MIN_BOX_CONFIDENCE]
+        metricsutils.increment(f"{self.game_title}.ocr_escalated_columns", result.escalated_columns)
+        logging.warning(f"Finished OCR of image: {image.name}. Skipped {result.skipped_columns} blank columns. "
+                        f"ROI cache hits: {result.cache_hits}/{result.cache_hits + result.cache_misses} "
+                        f"({hit_rate:.0%} overall). Re-read {result.escalated_columns} columns at a bigger scale. "
+                        f"Low confidence columns: {low_confidence}.")
+
+        # First column always starts with 1.
+        column_dict: dict[int, int] = {0: 1}
+        confidence_dict: dict[int, float] = {0: 100}
+        for column_num, (measure_number, conf) in enumerate(zip(result.measure_numbers, result.confidences), start=1):
+            column_dict[column_num] = measure_number
+            confidence_dict[column_num] = conf
+        return column_dict, confidence_dict
+
+    async def reread_low_confidence_columns(self, image: SharedImage, use_doubles_spacing: bool,
+                                            column_dict: dict[int, int], confidence_dict: dict[int, float],
+                                            min_confidence: float = MEASURE_MIN_CONFIDENCE) \
+            -> tuple[dict[int, int], dict[int, float]]:
+        # Reads only the columns we aren't confident in again, one Tesseract call per column and without the ROI
+        # cache, then repairs the measures again with the new reads. This is much cheaper than redoing the chart.
+        column_nums = [column_num for column_num, conf in confidence_dict.items()
+                       if column_num > 0 and conf < min_confidence]
+        if not column_nums:
+            return column_dict, confidence_dict
+        logging.warning(f"Re-reading columns {column_nums} of image: {image.name}.")
+        result = await self.render_service.submit(ocr_chart, image, self.get_geometry(use_doubles_spacing),
+                                                  OcrBackend.TESSERACT, None, None, column_nums)
+        column_dict = column_dict.copy()
+        confidence_dict = confidence_dict.copy()
+        for column_num, measure_number, conf in zip(column_nums, result.measure_numbers, result.confidences):
+            column_dict[column_num] = measure_number
+            confidence_dict[column_num] = conf
+        return await self.adjust_measures(column_dict, confidence_dict)
+
+    def get_geometry(self, use_doubles_spacing: bool) -> FncGeometry:
+        # Gets the measure number and column locations of a chart, which is everything the render workers need.
         spacing_value: int
         if use_doubles_spacing:
             spacing_value = self.doubles_spacing_px
         else:
             spacing_value = self.spacing_px
 
-        resize_value = self.ocr_scale_multiplier
-        column_width = spacing_value * resize_value
-        roi_x1_begin = self.x1_left_px * resize_value
-        roi_x2_begin = self.x2_left_px * resize_value
-        roi_y1_begin = self.y1_bottom_px * resize_value
-        roi_y2_begin = self.y2_bottom_px * resize_value
-
-        # Pre-process image for Tesseract.
-        img = cv2.imread(file_path)
-        img_rsz = cv2.resize(img, (0, 0), fx=resize_value, fy=resize_value)
-        h, w, c = img_rsz.shape
-        img_rct = cv2.rectangle(img_rsz, (0, h - self.bottom_cutoff_px * resize_value), (w, h), (0, 0, 0), -1)
-        gray_image = cv2.cvtColor(img_rct, cv2.COLOR_BGR2GRAY)
-        thresh = cv2.threshold(gray_image, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)[1]
-
-        # Get basic details about the image, so we can loop over
-        # each column to check the measure numbers.
-        columns = round(w / column_width)
-
-        # Loop over each ROI and get the text. First column always starts with 1.
-        column_dict: dict[int, int] = {0: 1}
-        for column_num in range(1, columns):
-            roi_x_1 = roi_x1_begin + (column_num * column_width)
-            roi_y_1 = h - roi_y1_begin
-            roi_x_2 = roi_x2_begin + (column_num * column_width)
-            roi_y_2 = h - roi_y2_begin
-            roi = thresh[roi_y_1:roi_y_2, roi_x_1:roi_x_2]
-            data = pytesseract.image_to_string(roi, lang='eng', config='--psm 10 --oem 3 -c '
-                                                                       'tessedit_char_whitelist=0123456789').strip()
-            measure_number = 0  # By default, assume it's nothing - we can always fix it later in adjust_measures().
-            if data != "":
-                measure_number = int(data)
-            column_dict[column_num] = measure_number
-        return column_dict
+        return FncGeometry(x1_left_px=self.x1_left_px, x2_left_px=self.x2_left_px, y1_bottom_px=self.y1_bottom_px,
+                           y2_bottom_px=self.y2_bottom_px, spacing_px=spacing_value,
+                           bottom_cutoff_px=self.bottom_cutoff_px, ocr_scale_multiplier=self.ocr_scale_multiplier,
+                           ocr_scale_tiers=list(range(self.ocr_min_scale_multiplier, self.ocr_scale_multiplier + 1))
+                           if self.ocr_min_scale_multiplier is not None else [])
+
+    async def get_digit_templates(self) -> numpy.ndarray | None:
+        # Gets the digit templates for this game, building them from the charts that have already been read if they
+        # don't exist yet. Returns None if there isn't enough cached data to build them. Templates that are missing
+        # some digits are used as they are (those digits fall back to Tesseract), and built again in the background
+        # once more charts have been read.
+        if self.digit_templates is None:
+            # The first charts read at the same time would otherwise all build them.
+            return await self.template_flights.do(self.game_title, self.build_digit_templates)
+        if self.digit_templates_outdated and self.template_flights.get(self.game_title) is None:
+            self.digit_templates_outdated = False
+            asyncutils.run_in_background(self.template_flights.do(self.game_title, self.build_digit_templates))
+        return self.digit_templates
+
+    async def build_digit_templates(self) -> numpy.ndarray | None:
+        # Templates are only saved once every digit has one, so templates built from the first few charts (which
+        # may only have a handful of digits between them) never stop better ones from being built later.
+        templates_path = f"{SONG_DATA_FOLDER}{self.game_title}/{TEMPLATE_FILE_NAME}"
+        saved_templates = load_digit_templates(templates_path)
+        if saved_templates is not None and not get_missing_digits(saved_templates):
+            self.digit_templates = saved_templates
+            return self.digit_templates
+
+        charts = [(image_path, measures, self.get_geometry(self.chart_filename_uses_doubles(chart_filename)))
+                  for chart_filename, image_path, measures in (await self.get_cached_charts())[:TEMPLATE_MAX_CHARTS]]
+        templates = await self.render_service.submit(build_templates, charts)
+        if templates is None:
+            logging.warning(f"Not enough cached charts to build digit templates for {self.game_title}.")
+            # Templates saved before incomplete ones stopped being saved are still better than none.
+            self.digit_templates = self.digit_templates if self.digit_templates is not None else saved_templates
+            return self.digit_templates
+        self.digit_templates = templates
+        missing_digits = get_missing_digits(templates)
+        if missing_digits:
+            logging.warning(f"Built digit templates for {self.game_title} from {len(charts)} charts, but digits "
+                            f"{missing_digits} didn't have enough samples. They'll be built again once more charts "
+                            f"have been read.")
+            return self.digit_templates
+        await asyncio.to_thread(save_digit_templates, templates, templates_path)
+        logging.warning(f"Built digit templates for {self.game_title} from {len(charts)} charts.")
+        return self.digit_templates
 
     @abstractmethod
-    async def adjust_measures(self, column_dict: dict[int, int]) -> dict[int, int]:
-        # OCR can be unreliable, so try to guess/fix the measures if they seem off.
-
-        # Get the average difference between measures.
-        new_dict = column_dict.copy()
-        # TODO: The next line will return 0 if the last number is misread and is small. Fix it somehow?
-        avg_measures = round(numpy.diff(list(new_dict.values())).sum() / (len(new_dict) - 1))
-        if avg_measures == 0:
-            avg_measures = 3  # Temporary fix that should work most of the time until a better solution is made
-
-        logging.warning(f"Average measure increase: {avg_measures}.")
-        for i in range(len(new_dict)):
-            if i == 0:
-                continue  # First value is always 1 by default, skip.
-            if new_dict[i] <= new_dict[i-1] or new_dict[i] - new_dict[i-1] >= self.measure_oob_tol:
-                new_dict[i] = new_dict[i-1] + avg_measures
+    async def get_cached_charts(self) -> list[tuple[str, str, dict[int, int]]]:
+        # Gets the chart filename, image path and measures of every chart that has already been downloaded and
+        # had its measures read.
+        charts: list[tuple[str, str, dict[int, int]]] = []
+        for chart_filename, song_folder, measures in await asyncio.to_thread(self.get_measure_index().get_all):
+            folder = f"{SONG_DATA_FOLDER}{self.game_title}/{song_folder}"
+            image_path = next((x for x in (f"{folder}/{chart_filename}", f"{folder}/{chart_filename}.png")
+                               if os.path.isfile(x)), None)
+            if image_path is None:
+                continue
+            charts.append((chart_filename, image_path, measures))
+        return charts
+
+    def chart_filename_uses_doubles(self, chart_filename: str) -> bool:
+        # Determines if a chart uses doubles spacing from its filename alone. Most games don't have doubles charts.
+        return False
+
+    @abstractmethod
+    async def adjust_measures(self, column_dict: dict[int, int],
+                              confidence_dict: dict[int, float]) -> tuple[dict[int, int], dict[int, float]]:
+        # OCR can be unreliable, so try to guess/fix the measures if they seem off. Returns the fixed measures along
+        # with how confident we are in each of them (0-100).
+        columns = sorted(column_dict)
+        numbers, confidences = repair_measures(numpy.array([column_dict[x] for x in columns]),
+                                               numpy.array([confidence_dict.get(x, 0) for x in columns]),
+                                               self.measure_oob_tol)
+        new_dict = dict(zip(columns, numbers.tolist()))
+        new_confidence_dict = dict(zip(columns, confidences.tolist()))
         logging.warning(f"Old measure numbers: {column_dict}.")
         logging.warning(f"New measure numbers: {new_dict}.")
-        return new_dict
+        logging.warning(f"Low confidence measures: "
+                        f"{[x for x in columns if new_confidence_dict[x] < MEASURE_MIN_CONFIDENCE]}.")
+        return new_dict, new_confidence_dict
 
     @abstractmethod
     async def get_columns_from_barclip(self, column_dict: dict[int, int], bar_start: str, bar_end: str):
@@ -223,28 +756,17 @@ class FncStrategy(ABC):
         return start_column, end_column
 
     @abstractmethod
-    async def crop_image(self, local_file_path: str, start_column: int, end_column: int,
-                         use_doubles_spacing: bool) -> str:
-        # Crops the image based off of the characteristics given during strategy creation.
-        logging.warning(f"Cropping started for file: {local_file_path}.")
-
-        spacing_value: int
-        if use_doubles_spacing:
-            spacing_value = self.doubles_spacing_px
-        else:
-            spacing_value = self.spacing_px
-
-        img = cv2.imread(local_file_path)
-        h, w, c = img.shape
-        crop_x_start = spacing_value * start_column
-        crop_x_end = spacing_value * end_column
-        crop = img[0:h, crop_x_start:crop_x_end]
-        cv2.imwrite(f"{SONG_DATA_FOLDER}/{self.game_title}/{OUTPUT_FILE_NAME}", crop)
-        return f"{SONG_DATA_FOLDER}/{self.game_title}/{OUTPUT_FILE_NAME}"
+    async def crop_image(self, image: SharedImage, start_column: int, end_column: int,
+                         use_doubles_spacing: bool) -> bytes:
+        # Crops the image based off of the characteristics given during strategy creation, and returns it as a PNG.
+        logging.warning(f"Cropping started for image: {image.name}.")
+        spacing_px = self.get_geometry(use_doubles_spacing).spacing_px
+        return await self.render_service.submit(crop_chart, image, spacing_px, start_column, end_column,
+                                                self.clip_options)
 
     @abstractmethod
-    async def create_embed(self, cropped_image_path: str, chart_url: str, **kwargs) -> Embed:
-        # Creates the Discord embed to be posted by the bot.
+    async def create_embed(self, attachment_filename: str, chart_url: str, **kwargs) -> Embed:
+        # Creates the Discord embed to be posted by the bot, showing the attached chart clip.
         # This will depend on the strategy's implementation, as different games may have the need for
         # different information being shown.
         raise
@@ -265,6 +787,12 @@ class FncStrategy(ABC):
         # game to game).
         raise NotImplementedError
 
+    @abstractmethod
+    async def get_charts(self) -> list[tuple]:
+        # Gets every (song, difficulty) pair for the given game, with both in the same form get_song() and
+        # get_difficulty() return them. This is used to index a whole catalog at once.
+        raise NotImplementedError
+
     @abstractmethod
     async def get_difficulty(self, **kwargs):
         # Gets the information about a single Difficulty object based on a selected Song
@@ -0,0 +1,112 @@
+import logging
+import os
+
+import cv2
+import numpy
+
+from bot.resources.fnc.fncconstants import TEMPLATE_GLYPH_SIZE, TEMPLATE_MIN_CORRELATION, TEMPLATE_MIN_SAMPLES
+
+
+def segment_digits(roi: numpy.ndarray) -> list[numpy.ndarray]:
+    # Splits a thresholded ROI into one ink mask per digit, left to right. Measure numbers use a fixed font with a
+    # gap between digits, so each run of columns containing ink is one digit. Anything much shorter than the
+    # tallest run is noise (stray chart lines, specks) and is dropped.
+    if roi.size == 0:
+        return []
+    background = numpy.median(numpy.concatenate((roi[0], roi[-1], roi[:, 0], roi[:, -1])))
+    ink = roi != background
+
+    has_ink = numpy.concatenate(([0], ink.any(axis=0).astype(numpy.int8), [0]))
+    edges = numpy.diff(has_ink)
+    starts = numpy.flatnonzero(edges == 1)
+    ends = numpy.flatnonzero(edges == -1)
+
+    glyphs: list[numpy.ndarray] = []
+    for start, end in zip(starts, ends):
+        rows = numpy.flatnonzero(ink[:, start:end].any(axis=1))
+        glyphs.append(ink[rows[0]:rows[-1] + 1, start:end])
+    if not glyphs:
+        return []
+    tallest = max(glyph.shape[0] for glyph in glyphs)
+    return [glyph for glyph in glyphs if glyph.shape[0] * 2 > tallest]
+
+
+def normalize_glyphs(glyphs: list[numpy.ndarray]) -> numpy.ndarray:
+    # Scales every glyph to the same size and turns them into zero-mean, unit-length rows, so a dot product between
+    # two rows is their correlation.
+    if not glyphs:
+        return numpy.zeros((0, TEMPLATE_GLYPH_SIZE[0] * TEMPLATE_GLYPH_SIZE[1]), dtype=numpy.float32)
+    vectors = numpy.stack([cv2.resize(glyph.astype(numpy.float32), TEMPLATE_GLYPH_SIZE,
+                                      interpolation=cv2.INTER_AREA).ravel() for glyph in glyphs])
+    vectors -= vectors.mean(axis=1, keepdims=True)
+    norms = numpy.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / numpy.where(norms == 0, 1, norms)
+
+
+def build_digit_templates(samples: list[tuple[numpy.ndarray, int]]) -> numpy.ndarray | None:
+    # Builds one template per digit (0-9) out of ROIs whose measure number is already known. Only ROIs that segment
+    # into exactly as many glyphs as the number has digits are used, so every glyph gets an unambiguous label.
+    # Digits without enough samples get an all-zero template, which never correlates, so those columns fall back.
+    labelled: dict[int, list[numpy.ndarray]] = {digit: [] for digit in range(10)}
+    for roi, measure_number in samples:
+        glyphs = segment_digits(roi)
+        digits = str(measure_number)
+        if len(glyphs) != len(digits):
+            continue
+        for glyph, digit in zip(glyphs, digits):
+            labelled[int(digit)].append(glyph)
+
+    if not any(len(glyphs) >= TEMPLATE_MIN_SAMPLES for glyphs in labelled.values()):
+        return None
+
+    templates = numpy.zeros((10, TEMPLATE_GLYPH_SIZE[0] * TEMPLATE_GLYPH_SIZE[1]), dtype=numpy.float32)
+    for digit, glyphs in labelled.items():
+        if len(glyphs) < TEMPLATE_MIN_SAMPLES:
+            logging.warning(f"Only {len(glyphs)} samples found for digit {digit}, it will not be template matched.")
+            continue
+        template = normalize_glyphs(glyphs).mean(axis=0)
+        template -= template.mean()
+        templates[digit] = template / numpy.linalg.norm(template)
+    return templates
+
+
+def get_missing_digits(templates: numpy.ndarray) -> list[int]:
+    # Gets the digits that didn't have enough samples to get a template (see build_digit_templates()).
+    return [digit for digit in range(10) if not templates[digit].any()]
+
+
+def load_digit_templates(file_path: str) -> numpy.ndarray | None:
+    if not os.path.isfile(file_path):
+        return None
+    return numpy.load(file_path)
+
+
+def save_digit_templates(templates: numpy.ndarray, file_path: str):
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    numpy.save(file_path, templates)
+
+
+def ocr_columns_template(rois: list[numpy.ndarray], templates: numpy.ndarray) -> list[tuple[int, float] | None]:
+    # Reads every ROI by correlating each of its glyphs against the digit templates. All glyphs of all ROIs are
+    # classified with one matrix multiplication. Each read comes with the weakest glyph correlation as its
+    # confidence (0-100). Blank ROIs come back as 0 like they do with Tesseract, and ROIs with a glyph that doesn't
+    # look enough like any template come back as None so they can be re-read with OCR.
+    glyphs_per_roi = [segment_digits(roi) for roi in rois]
+    vectors = normalize_glyphs([glyph for glyphs in glyphs_per_roi for glyph in glyphs])
+    scores = vectors @ templates.T
+    digits = scores.argmax(axis=1)
+    best_scores = scores.max(axis=1, initial=0)
+
+    results: list[tuple[int, float] | None] = []
+    position = 0
+    for glyphs in glyphs_per_roi:
+        count = len(glyphs)
+        if count == 0:
+            results.append((0, 0.0))
+        elif (best_scores[position:position + count] >= TEMPLATE_MIN_CORRELATION).all():
+            results.append((int("".join(str(digit) for digit in digits[position:position + count])),
+                            float(best_scores[position:position + count].min()) * 100))
+        else:
+            results.append(None)
+        position += count
+    return results
@@ -1,9 +1,5 @@
-import json
 import discord
-import logging
 import msgspec
-import os
-import requests
 import re
 from discord import Embed
 from unidecode import unidecode
@@ -11,17 +7,25 @@ from unidecode import unidecode
 from bot.resources.fnc.fncstrategy import FncStrategy
 from bot.resources.fnc.sdvx.main.songdata import SONGS
 from bot.resources.fnc.sdvx.sdvxfncmodels import Song, LEVEL_MAPPINGS
-from bot.resources.fnc.fncconstants import DEFAULT_BARCLIP, BARCLIP_REGEX, SONG_DATA_FOLDER, OUTPUT_FILE_NAME
+from bot.resources.fnc.fncconstants import DEFAULT_BARCLIP, BARCLIP_REGEX, SONG_DATA_FOLDER, CLIP_MAX_BYTES
+from bot.resources.fnc.fncimage import SharedImage
+from bot.resources.models.enums import OcrBackend
+from bot.utils.httputils import HttpResponse
 
 SONG_LIST: list[Song] = msgspec.json.decode(SONGS, type=list[Song])
 
 
 class SdvxFncStrategy(FncStrategy):
     def __init__(self, x1_left_px, x2_left_px, y1_bottom_px, y2_bottom_px, spacing_px, doubles_spacing_px,
-                 bottom_cutoff_px, ocr_scale_multiplier, measure_oob_tol, game_title):
+                 bottom_cutoff_px, ocr_scale_multiplier, measure_oob_tol, game_title,
+                 ocr_backend=OcrBackend.TESSERACT_BATCHED, render_service=None, ocr_min_scale_multiplier=None,
+                 column_tiles=False, max_columns_per_row=None, clip_encodings=None,
+                 clip_max_bytes=CLIP_MAX_BYTES, http_client=None):
         super(SdvxFncStrategy, self).__init__(x1_left_px, x2_left_px, y1_bottom_px, y2_bottom_px, spacing_px,
                                               doubles_spacing_px, bottom_cutoff_px, ocr_scale_multiplier,
-                                              measure_oob_tol, game_title)
+                                              measure_oob_tol, game_title, ocr_backend, render_service,
+                                              ocr_min_scale_multiplier, column_tiles, max_columns_per_row,
+                                              clip_encodings, clip_max_bytes, http_client)
         pass
 
     async def execute_strategy(self, ctx, **kwargs):
@@ -47,30 +51,26 @@ class SdvxFncStrategy(FncStrategy):
     async def map_chart_filename(self, **kwargs) -> str:
         return f"{kwargs['song'].songid}-{await self.map_chart_type(level_type=kwargs['difficulty'].type)}"
 
-    async def download_image_file(self, **kwargs) -> str:
-        song = kwargs["song"]
-        difficulty = kwargs["difficulty"]
+    async def download_image(self, **kwargs) -> HttpResponse:
+        return await self.http_client.get(f'https://sdvxindex.com{kwargs["difficulty"].columnPath}',
+                                          headers=kwargs.get("headers"), hedge=True)
 
-        image = requests.get(f'https://sdvxindex.com{difficulty.columnPath}').content
-        filename = await self.get_local_song_id_folder_plus_filename(song=song, difficulty=difficulty)
-        if not os.path.isfile(filename):
-            # Cache the file if it doesn't exist.
-            path = await self.get_local_song_id_folder(song=song)
-            os.makedirs(path, exist_ok=True)
-            with open(filename, "wb") as handler:
-                handler.write(image)
-        else:
-            logging.warning(f"Cached file already found, using file {filename}.")
-        return filename
+    async def get_local_image_path(self, **kwargs) -> str:
+        return await self.get_local_song_id_folder_plus_filename(song=kwargs["song"], difficulty=kwargs["difficulty"])
 
     async def use_doubles_spacing(self, **kwargs):
         return await super(SdvxFncStrategy, self).use_doubles_spacing(**kwargs)
 
-    async def get_measure_numbers_from_image(self, file_path: str, use_doubles_spacing: bool) -> dict[int, int]:
-        return await super(SdvxFncStrategy, self).get_measure_numbers_from_image(file_path, use_doubles_spacing)
+    async def get_measure_numbers_from_image(self, image: SharedImage,
+                                             use_doubles_spacing: bool) -> tuple[dict[int, int], dict[int, float]]:
+        return await super(SdvxFncStrategy, self).get_measure_numbers_from_image(image, use_doubles_spacing)
 
-    async def adjust_measures(self, column_dict: dict[int, int]) -> dict[int, int]:
-        return await super(SdvxFncStrategy, self).adjust_measures(column_dict)
+    async def get_cached_charts(self) -> list[tuple[str, str, dict[int, int]]]:
+        return await super(SdvxFncStrategy, self).get_cached_charts()
+
+    async def adjust_measures(self, column_dict: dict[int, int],
+                              confidence_dict: dict[int, float]) -> tuple[dict[int, int], dict[int, float]]:
+        return await super(SdvxFncStrategy, self).adjust_measures(column_dict, confidence_dict)
 
     async def get_columns_from_barclip(self, column_dict: dict[int, int], bar_start: str, bar_end: str):
         return await super(SdvxFncStrategy, self).get_columns_from_barclip(column_dict, bar_start, bar_end)
@@ -106,12 +106,11 @@ class SdvxFncStrategy(FncStrategy):
         return (f"https://sdvxindex.com/s/{kwargs['song'].songid}/"
                 f"{await self.map_chart_type(level_type=kwargs['difficulty'].type)}")
 
-    async def crop_image(self, local_file_path: str, start_column: int, end_column: int,
-                         use_doubles_spacing: bool) -> str:
-        return await super(SdvxFncStrategy, self).crop_image(local_file_path, start_column, end_column,
-                                                             use_doubles_spacing)
+    async def crop_image(self, image: SharedImage, start_column: int, end_column: int,
+                         use_doubles_spacing: bool) -> bytes:
+        return await super(SdvxFncStrategy, self).crop_image(image, start_column, end_column, use_doubles_spacing)
 
-    async def create_embed(self, cropped_image_path: str, chart_url: str, **kwargs) -> Embed:
+    async def create_embed(self, attachment_filename: str, chart_url: str, **kwargs) -> Embed:
         song = kwargs["song"]
         difficulty = kwargs["difficulty"]
 
@@ -125,39 +124,17 @@ class SdvxFncStrategy(FncStrategy):
         embed.add_field(name='Illustrated By', value=f'{difficulty.illustratorName}')
         embed.add_field(name='sdvxindex URL', value=f'{chart_url}',
                         inline=False)
-        embed.set_image(url=f'attachment://{OUTPUT_FILE_NAME}')
+        embed.set_image(url=f'attachment://{attachment_filename}')
         return embed
 
-    async def get_measure_file_name(self, **kwargs):
-        partial_filename = await self.map_chart_filename(song=kwargs["song"], difficulty=kwargs["difficulty"])
-        return f"measures-{partial_filename}.json"
-
     async def measure_file_exists(self, **kwargs) -> bool:
-        song = kwargs["song"]
-        difficulty = kwargs["difficulty"]
-
-        filename = await self.get_measure_file_name(song=song, difficulty=difficulty)
-        path = await self.get_local_song_id_folder(song=song)
-        return os.path.isfile(f"{path}{filename}")
+        return await super(SdvxFncStrategy, self).measure_file_exists(**kwargs)
 
     async def get_measure_numbers_from_file(self, **kwargs) -> dict[int, int]:
-        song = kwargs["song"]
-
-        filename = await self.get_measure_file_name(song=song, difficulty=kwargs["difficulty"])
-        path = await self.get_local_song_id_folder(song=song)
-        with open(f"{path}{filename}") as fp:
-            data = json.load(fp)
-        return {int(key): value for key, value in data.items()}
+        return await super(SdvxFncStrategy, self).get_measure_numbers_from_file(**kwargs)
 
     async def save_measure_numbers_to_file(self, measures: dict[int, int], **kwargs):
-        song = kwargs["song"]
-        difficulty = kwargs["difficulty"]
-
-        filename = await self.get_measure_file_name(song=song, difficulty=difficulty)
-        path = await self.get_local_song_id_folder(song=song)
-        os.makedirs(path, exist_ok=True)
-        with open(f"{path}{filename}", 'w') as fp:
-            json.dump(measures, fp)
+        return await super(SdvxFncStrategy, self).save_measure_numbers_to_file(measures, **kwargs)
 
     async def get_local_song_id_folder_plus_filename(self, **kwargs) -> str:
         filename = await self.map_chart_filename(song=kwargs['song'], difficulty=kwargs["difficulty"])
@@ -175,3 +152,6 @@ class SdvxFncStrategy(FncStrategy):
 
     async def get_difficulty(self, **kwargs):
         return next(x for x in kwargs["song"].difficulties if x.level == int(kwargs["difficulty"]))
+
+    async def get_charts(self) -> list[tuple]:
+        return [(song, difficulty) for song in SONG_LIST for difficulty in song.difficulties]
@@ -1,8 +1,5 @@
 import discord
-import logging
 import msgspec
-import os
-import requests
 import re
 from discord import Embed
 from unidecode import unidecode
@@ -10,18 +7,26 @@ from unidecode import unidecode
 from bot.resources.fnc.sdvx.main.sdvxfncstrategy import SdvxFncStrategy
 from bot.resources.fnc.sdvx.plus.songdataplus import SONGSPLUS
 from bot.resources.fnc.sdvx.sdvxfncmodels import SongPlus, LEVEL_MAPPINGS
-from bot.resources.fnc.fncconstants import DEFAULT_BARCLIP, BARCLIP_REGEX, SONG_DATA_FOLDER, OUTPUT_FILE_NAME, \
-    SDVXPLUS_CLOUDFRONT
+from bot.resources.fnc.fncconstants import DEFAULT_BARCLIP, BARCLIP_REGEX, SONG_DATA_FOLDER, \
+    SDVXPLUS_CLOUDFRONT, CLIP_MAX_BYTES
+from bot.resources.fnc.fncimage import SharedImage
+from bot.resources.models.enums import OcrBackend
+from bot.utils.httputils import HttpResponse
 
 SONG_LIST: list[SongPlus] = msgspec.json.decode(SONGSPLUS, type=list[SongPlus])
 
 
 class SdvxPlusFncStrategy(SdvxFncStrategy):
     def __init__(self, x1_left_px, x2_left_px, y1_bottom_px, y2_bottom_px, spacing_px, doubles_spacing_px,
-                 bottom_cutoff_px, ocr_scale_multiplier, measure_oob_tol, game_title):
+                 bottom_cutoff_px, ocr_scale_multiplier, measure_oob_tol, game_title,
+                 ocr_backend=OcrBackend.TESSERACT_BATCHED, render_service=None, ocr_min_scale_multiplier=None,
+                 column_tiles=False, max_columns_per_row=None, clip_encodings=None,
+                 clip_max_bytes=CLIP_MAX_BYTES, http_client=None):
         super(SdvxPlusFncStrategy, self).__init__(x1_left_px, x2_left_px, y1_bottom_px, y2_bottom_px, spacing_px,
                                                   doubles_spacing_px, bottom_cutoff_px, ocr_scale_multiplier,
-                                                  measure_oob_tol, game_title)
+                                                  measure_oob_tol, game_title, ocr_backend, render_service,
+                                                  ocr_min_scale_multiplier, column_tiles, max_columns_per_row,
+                                                  clip_encodings, clip_max_bytes, http_client)
         pass
 
     async def execute_strategy(self, ctx, **kwargs):
@@ -40,30 +45,29 @@ class SdvxPlusFncStrategy(SdvxFncStrategy):
     async def map_chart_filename(self, **kwargs) -> str:
         return f"{kwargs['song'].id}-{kwargs['difficulty'].idx}"
 
-    async def download_image_file(self, **kwargs) -> str:
+    async def download_image(self, **kwargs) -> HttpResponse:
         song = kwargs["song"]
         difficulty = kwargs["difficulty"]
+        return await self.http_client.get(f'{SDVXPLUS_CLOUDFRONT}{str(song.id).zfill(4)}/r_{difficulty.idx}.png',
+                                          headers=kwargs.get("headers"), hedge=True)
 
-        image = requests.get(f'{SDVXPLUS_CLOUDFRONT}{str(song.id).zfill(4)}/r_{difficulty.idx}.png').content
-        path = (f'{SONG_DATA_FOLDER}{self.game_title}/{str(song.id).zfill(4)}/'
-                f'{await self.map_chart_filename(song=song, difficulty=difficulty)}.png')
-        if not os.path.isfile(path):
-            # Cache the file if it doesn't exist.
-            os.makedirs(f'{SONG_DATA_FOLDER}{self.game_title}/{str(song.id).zfill(4)}/', exist_ok=True)
-            with open(path, "wb") as handler:
-                handler.write(image)
-        else:
-            logging.warning(f"Cached file already found, using file {path}.")
-        return path
+    async def get_local_image_path(self, **kwargs) -> str:
+        return await self.get_local_song_id_folder_plus_filename(song=kwargs["song"],
+                                                                 difficulty=kwargs["difficulty"]) + ".png"
 
     async def use_doubles_spacing(self, **kwargs):
         return await super(SdvxPlusFncStrategy, self).use_doubles_spacing(**kwargs)
 
-    async def get_measure_numbers_from_image(self, file_path: str, use_doubles_spacing: bool) -> dict[int, int]:
-        return await super(SdvxPlusFncStrategy, self).get_measure_numbers_from_image(file_path, use_doubles_spacing)
+    async def get_measure_numbers_from_image(self, image: SharedImage,
+                                             use_doubles_spacing: bool) -> tuple[dict[int, int], dict[int, float]]:
+        return await super(SdvxPlusFncStrategy, self).get_measure_numbers_from_image(image, use_doubles_spacing)
 
-    async def adjust_measures(self, column_dict: dict[int, int]) -> dict[int, int]:
-        return await super(SdvxPlusFncStrategy, self).adjust_measures(column_dict)
+    async def get_cached_charts(self) -> list[tuple[str, str, dict[int, int]]]:
+        return await super(SdvxPlusFncStrategy, self).get_cached_charts()
+
+    async def adjust_measures(self, column_dict: dict[int, int],
+                              confidence_dict: dict[int, float]) -> tuple[dict[int, int], dict[int, float]]:
+        return await super(SdvxPlusFncStrategy, self).adjust_measures(column_dict, confidence_dict)
 
     async def get_columns_from_barclip(self, column_dict: dict[int, int], bar_start: str, bar_end: str):
         return await super(SdvxPlusFncStrategy, self).get_columns_from_barclip(column_dict, bar_start, bar_end)
@@ -98,12 +102,11 @@ class SdvxPlusFncStrategy(SdvxFncStrategy):
     async def get_song_url(self, **kwargs) -> str:
         return f"https://sdvxplus.zip/unzip/{kwargs['song'].id}/{kwargs['difficulty'].idx}"
 
-    async def crop_image(self, local_file_path: str, start_column: int, end_column: int,
-                         use_doubles_spacing: bool) -> str:
-        return await super(SdvxPlusFncStrategy, self).crop_image(local_file_path, start_column, end_column,
-                                                                 use_doubles_spacing)
+    async def crop_image(self, image: SharedImage, start_column: int, end_column: int,
+                         use_doubles_spacing: bool) -> bytes:
+        return await super(SdvxPlusFncStrategy, self).crop_image(image, start_column, end_column, use_doubles_spacing)
 
-    async def create_embed(self, cropped_image_path: str, chart_url: str, **kwargs) -> Embed:
+    async def create_embed(self, attachment_filename: str, chart_url: str, **kwargs) -> Embed:
         song = kwargs["song"]
         difficulty = kwargs["difficulty"]
 
@@ -116,12 +119,9 @@ class SdvxPlusFncStrategy(SdvxFncStrategy):
         embed.add_field(name='Effected By', value=f'{difficulty.effector}')
         embed.add_field(name='sdvxplus URL', value=f'{await self.get_song_url(song=song, difficulty=difficulty)}',
                         inline=False)
-        embed.set_image(url=f'attachment://{OUTPUT_FILE_NAME}')
+        embed.set_image(url=f'attachment://{attachment_filename}')
         return embed
 
-    async def get_measure_file_name(self, **kwargs):
-        return await super(SdvxPlusFncStrategy, self).get_measure_file_name(**kwargs)
-
     async def measure_file_exists(self, **kwargs) -> bool:
         return await super(SdvxPlusFncStrategy, self).measure_file_exists(**kwargs)
 
@@ -145,3 +145,6 @@ class SdvxPlusFncStrategy(SdvxFncStrategy):
 
     async def get_difficulty(self, **kwargs):
         return next(x for x in kwargs["song"].diffs if x.level == int(kwargs["difficulty"]))
+
+    async def get_charts(self) -> list[tuple]:
+        return [(song, difficulty) for song in SONG_LIST for difficulty in song.diffs]
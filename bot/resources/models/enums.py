@@ -6,3 +6,16 @@ class MatchType(IntEnum):
     CBS = 1
     ROUNDONE = 2
     CHUNITHM = 3
+
+
+class OcrBackend(IntEnum):
+    TESSERACT = 0  # One Tesseract call per column.
+    TESSERACT_BATCHED = 1  # One Tesseract call per chart, falling back per column for anything ambiguous.
+    TEMPLATE = 2  # Digit template matching, falling back to TESSERACT_BATCHED for anything unrecognized.
+
+
+class ClipEncoding(IntEnum):
+    PNG = 0  # OpenCV's default PNG settings. The fastest to encode.
+    PNG_SMALLEST = 1  # PNG at the highest compression level.
+    PNG_INDEXED = 2  # PNG with a palette of up to 256 colors. Lossless unless the clip has more colors than that.
+    WEBP_LOSSLESS = 3  # Lossless WebP. Usually the smallest, but the slowest to encode.
@@ -0,0 +1,59 @@
+import asyncio
+import logging
+from collections.abc import Hashable
+
+from bot.utils import metricsutils
+
+# Tasks started with run_in_background() that haven't finished yet. The event loop only keeps weak references to
+# tasks.
+BACKGROUND_TASKS = set()
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        """
+        Makes sure a piece of work only runs once at a time per key. The first caller starts it, and everyone who
+        asks for the same key while it's running waits on that same run instead of starting their own. Nothing is
+        kept once it finishes, so this isn't a cache - it only merges requests that overlap.
+
+        The work runs in its own task, so one caller giving up doesn't cancel it for everyone else. It's only
+        cancelled once every caller waiting on it has given up.
+
+        name - What the work is called in the metrics.
+        """
+        self.name = name
+        self.tasks: dict[Hashable, asyncio.Task] = {}
+        self.waiters: dict[asyncio.Task, int] = {}
+
+    def get(self, key: Hashable) -> asyncio.Task | None:
+        return self.tasks.get(key)
+
+    async def do(self, key: Hashable, fn, *args, **kwargs):
+        task = self.tasks.get(key)
+        if task is None:
+            task = asyncio.create_task(fn(*args, **kwargs))
+            self.tasks[key] = task
+            task.add_done_callback(lambda done: self.tasks.pop(key) if self.tasks.get(key) is done else None)
+        else:
+            metricsutils.increment(f"{self.name}.coalesced")
+        metricsutils.increment(f"{self.name}.calls")
+
+        self.waiters[task] = self.waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self.waiters[task] -= 1
+            if self.waiters[task] == 0:
+                del self.waiters[task]
+                if not task.done():
+                    task.cancel()
+
+
+def run_in_background(coro):
+    # Runs a coroutine without anyone waiting on it. Anything it raises is logged.
+    task = asyncio.create_task(coro)
+    BACKGROUND_TASKS.add(task)
+    task.add_done_callback(BACKGROUND_TASKS.discard)
+    task.add_done_callback(
+        lambda done: logging.warning(f"Background task failed. Error: {done.exception()!r}.")
+        if not done.cancelled() and done.exception() is not None else None)
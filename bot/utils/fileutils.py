@@ -0,0 +1,35 @@
+import asyncio
+import logging
+import os
+
+# Background writes that haven't finished yet. The event loop only keeps weak references to tasks.
+WRITE_BEHIND_TASKS = set()
+
+
+def read_file(path: str) -> bytes:
+    with open(path, "rb") as handler:
+        return handler.read()
+
+
+def write_file_atomic(path: str, data: bytes):
+    # Writes to a temporary file next to the real one and renames it into place, so nobody ever reads a half
+    # written file.
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as handler:
+        handler.write(data)
+    os.replace(temp_path, path)
+
+
+async def write_file_in_background(path: str, data: bytes):
+    try:
+        await asyncio.to_thread(write_file_atomic, path, data)
+    except OSError as e:
+        logging.warning(f"Failed to write file {path}. Error: {e}.")
+
+
+def write_behind(path: str, data: bytes):
+    # Writes a file without making the caller wait for it.
+    task = asyncio.create_task(write_file_in_background(path, data))
+    WRITE_BEHIND_TASKS.add(task)
+    task.add_done_callback(WRITE_BEHIND_TASKS.discard)
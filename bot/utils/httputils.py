@@ -0,0 +1,181 @@
+import asyncio
+import os
+import time
+from collections import defaultdict, deque
+from urllib.parse import urlsplit
+
+import aiohttp
+from msgspec import Struct
+
+from bot.utils import metricsutils
+
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", 30))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 10))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 100))
+HTTP_MAX_CONNECTIONS_PER_HOST = int(os.getenv("HTTP_MAX_CONNECTIONS_PER_HOST", 8))
+HTTP_DNS_CACHE_SECONDS = int(os.getenv("HTTP_DNS_CACHE_SECONDS", 300))
+HTTP_KEEPALIVE_SECONDS = int(os.getenv("HTTP_KEEPALIVE_SECONDS", 60))
+# A hedged request sends a second copy of itself once it has taken longer than this percentile of the host's recent
+# requests. Hedging only starts once a host has this many samples.
+HTTP_HEDGE_PERCENTILE = float(os.getenv("HTTP_HEDGE_PERCENTILE", 95))
+HTTP_HEDGE_MIN_SAMPLES = 20
+HTTP_HEDGE_WINDOW = 200
+# The share of hedgeable requests that can be hedged, so hosts never see more than this much extra load. 0 turns
+# hedging off. Unused budget carries over, up to a burst of HTTP_HEDGE_MAX_BURST hedges.
+HTTP_HEDGE_BUDGET = float(os.getenv("HTTP_HEDGE_BUDGET", 0.05))
+HTTP_HEDGE_MAX_BURST = 10
+
+
+class HttpError(Exception):
+    # Raised when a request couldn't be made at all, or timed out. Responses with an error status aren't errors.
+    pass
+
+
+class HttpResponse(Struct):
+    url: str
+    status: int
+    # Header names are lowercase.
+    headers: dict[str, str]
+    content: bytes
+
+    @property
+    def ok(self) -> bool:
+        return self.status < 400
+
+
+class HttpClient:
+    def __init__(self, timeout: float = HTTP_TIMEOUT, connect_timeout: float = HTTP_CONNECT_TIMEOUT,
+                 max_connections: int = HTTP_MAX_CONNECTIONS,
+                 max_connections_per_host: int = HTTP_MAX_CONNECTIONS_PER_HOST,
+                 dns_cache_seconds: int = HTTP_DNS_CACHE_SECONDS, keepalive_seconds: int = HTTP_KEEPALIVE_SECONDS,
+                 hedge_percentile: float = HTTP_HEDGE_PERCENTILE, hedge_budget: float = HTTP_HEDGE_BUDGET):
+        """
+        The HTTP client every upstream fetch of the bot goes through, so none of them block the event loop.
+        Connections are kept alive and reused, and DNS lookups are cached, so repeat fetches from the same site skip
+        the DNS, TCP and TLS round trips.
+
+        Notes:
+        timeout - The most, in seconds, a whole request can take, unless the request asks for its own.
+        connect_timeout - The most, in seconds, getting a connection can take, including waiting for a free one.
+        max_connections - The most requests that can be in flight at once, across every host.
+        max_connections_per_host - The most requests that can be in flight at once to the same host. Anything past
+            that waits for a connection to free up, so a burst of commands can't hammer a single site.
+        dns_cache_seconds - How long a host's DNS lookup is reused for.
+        keepalive_seconds - How long an idle connection is kept open for reuse.
+        hedge_percentile - Requests made with hedge=True send a second copy of themselves once they've taken longer
+            than this percentile of the host's recent requests, and whichever copy finishes first is used. A slow
+            response from an upstream that's usually quick then costs about one p95 more instead of a whole p99.
+        hedge_budget - The share of hedgeable requests that are allowed to actually be hedged, so a host that's slow
+            across the board never gets more than that much extra load from hedges. 0 turns hedging off.
+        """
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_connections = max_connections
+        self.max_connections_per_host = max_connections_per_host
+        self.dns_cache_seconds = dns_cache_seconds
+        self.keepalive_seconds = keepalive_seconds
+        self.hedge_percentile = hedge_percentile
+        self.hedge_budget = hedge_budget
+        self.session: aiohttp.ClientSession | None = None
+        # The latencies of the most recent successful requests of each host (including ones cancelled by a hedge,
+        # as how long they ran for), and the hedges that can be sent.
+        self.latencies: dict[str, deque] = defaultdict(lambda: deque(maxlen=HTTP_HEDGE_WINDOW))
+        self.hedge_tokens = 0.0
+
+    def get_session(self) -> aiohttp.ClientSession:
+        # Made on first use rather than in the constructor, since a session belongs to the event loop it was made in.
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, limit_per_host=self.max_connections_per_host,
+                                             ttl_dns_cache=self.dns_cache_seconds,
+                                             keepalive_timeout=self.keepalive_seconds)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(
+                total=self.timeout, connect=self.connect_timeout))
+        return self.session
+
+    async def request(self, method: str, url: str, params: dict | None = None, headers: dict | None = None,
+                      timeout: float | None = None) -> HttpResponse:
+        host = urlsplit(url).hostname
+        started = time.perf_counter()
+        options = {"timeout": aiohttp.ClientTimeout(total=timeout, connect=self.connect_timeout)} \
+            if timeout is not None else {}
+        try:
+            async with self.get_session().request(method, url, params=params, headers=headers, **options) as response:
+                content = await response.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            metricsutils.increment(f"http.{host}.errors")
+            raise HttpError(f"{method} {url} failed. Error: {e!r}.") from e
+        elapsed = time.perf_counter() - started
+        metricsutils.observe(f"http.{host}", elapsed)
+        self.latencies[host].append(elapsed)
+        metricsutils.increment(f"http.{host}.bytes", len(content))
+        return HttpResponse(url=str(response.url), status=response.status,
+                            headers={name.lower(): value for name, value in response.headers.items()},
+                            content=content)
+
+    async def get(self, url: str, hedge: bool = False, **kwargs) -> HttpResponse:
+        if hedge:
+            return await self.hedged_request("GET", url, **kwargs)
+        return await self.request("GET", url, **kwargs)
+
+    def get_latency_percentile(self, host: str, percentile: float) -> float | None:
+        # Gets a percentile of the host's recent request latencies, or None if there aren't enough samples.
+        latencies = self.latencies[host]
+        if len(latencies) < HTTP_HEDGE_MIN_SAMPLES:
+            return None
+        return sorted(latencies)[min(int(len(latencies) * percentile / 100), len(latencies) - 1)]
+
+    async def hedged_request(self, method: str, url: str, **kwargs) -> HttpResponse:
+        host = urlsplit(url).hostname
+        metricsutils.increment(f"http.{host}.hedgeable")
+        self.hedge_tokens = min(self.hedge_tokens + self.hedge_budget, HTTP_HEDGE_MAX_BURST)
+        delay = self.get_latency_percentile(host, self.hedge_percentile)
+        started = time.perf_counter()
+        primary = asyncio.create_task(self.request(method, url, **kwargs))
+        hedge = None
+        try:
+            if delay is None or not (await asyncio.wait([primary], timeout=delay))[1]:
+                return await primary
+            if self.hedge_tokens < 1:
+                metricsutils.increment(f"http.{host}.hedges_over_budget")
+                return await primary
+            self.hedge_tokens -= 1
+            metricsutils.increment(f"http.{host}.hedges")
+            hedge = asyncio.create_task(self.request(method, url, **kwargs))
+
+            # The first copy that succeeds wins, and the other one is cancelled so the host only ever sees the
+            # extra load for as long as both are running. If one fails, the other one still gets its chance.
+            pending = {primary, hedge}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((task for task in done if task.exception() is None), None)
+                if winner is None:
+                    continue
+                if winner is hedge:
+                    metricsutils.increment(f"http.{host}.hedge_wins")
+                    if not primary.done():
+                        self.record_cancelled_request(host, time.perf_counter() - started)
+                return winner.result()
+            raise primary.exception()
+        finally:
+            for task in (primary, hedge):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    def record_cancelled_request(self, host: str, elapsed: float):
+        # The original request of a hedge that won gets cancelled, so all that's known is that it would have taken
+        # longer than it ran for. How much longer is estimated from the host's recent requests that took longer than
+        # that too (if none did, the win is only counted). It's kept as a latency all the same, otherwise the host's
+        # slowest requests would be the ones that never get counted, and its percentiles would drift lower the more
+        # often hedges win.
+        slower = [latency for latency in self.latencies[host] if latency > elapsed]
+        if slower:
+            metricsutils.observe(f"http.{host}.hedge_latency_saved", sum(slower) / len(slower) - elapsed)
+        self.latencies[host].append(elapsed)
+
+    async def head(self, url: str, **kwargs) -> HttpResponse:
+        return await self.request("HEAD", url, **kwargs)
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
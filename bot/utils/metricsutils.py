@@ -0,0 +1,34 @@
+import logging
+from collections import defaultdict
+
+# In-memory performance metrics for the bot process. Counters only ever go up, timings keep a count, total and max.
+COUNTERS: dict[str, float] = defaultdict(float)
+TIMINGS: dict[str, dict[str, float]] = defaultdict(lambda: {"count": 0, "total": 0.0, "max": 0.0})
+
+
+def increment(name: str, value: float = 1):
+    COUNTERS[name] += value
+
+
+def observe(name: str, seconds: float):
+    timing = TIMINGS[name]
+    timing["count"] += 1
+    timing["total"] += seconds
+    timing["max"] = max(timing["max"], seconds)
+
+
+def get_ratio(numerator: str, denominator: str) -> float:
+    # Gets the ratio of one counter to another, for example hits / (hits + misses).
+    return COUNTERS[numerator] / COUNTERS[denominator] if COUNTERS[denominator] else 0.0
+
+
+def format_metrics() -> str:
+    lines = [f"{name}: {value:g}" for name, value in sorted(COUNTERS.items())]
+    lines += [f"{name}: {timing['count']:g} calls, avg {timing['total'] / timing['count'] * 1000:.1f}ms, "
+              f"max {timing['max'] * 1000:.1f}ms"
+              for name, timing in sorted(TIMINGS.items()) if timing["count"]]
+    return "\n".join(lines) if lines else "No metrics recorded yet."
+
+
+def log_metrics():
+    logging.warning(f"Metrics:\n{format_metrics()}")
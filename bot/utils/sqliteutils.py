@@ -0,0 +1,25 @@
+import os
+import sqlite3
+import threading
+
+
+class SharedConnection(sqlite3.Connection):
+    def __init__(self, *args, **kwargs):
+        """
+        A SQLite connection that can be used from any thread, so the bot can run its queries with asyncio.to_thread()
+        instead of on the event loop. Only one thread can use it at a time, so everything that uses it holds lock.
+        """
+        super().__init__(*args, **kwargs)
+        self.lock = threading.RLock()
+
+
+def connect(db_path: str) -> SharedConnection:
+    # Opens a SQLite database that can safely be shared between the bot and its render workers. WAL lets readers
+    # carry on while someone is writing, and the busy timeout makes concurrent writers wait their turn instead of
+    # failing straight away.
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    connection = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False,
+                                 factory=SharedConnection)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    return connection
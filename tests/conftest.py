@@ -0,0 +1,60 @@
+import datetime
+
+import cv2
+import discord
+import numpy
+import pytest
+
+from bot.resources.fnc import fncstrategy
+from bot.resources.fnc.ddr import threeicecreamstrategy
+from bot.resources.fnc.fncrender import RenderService
+
+
+class FakeFollowup:
+    def __init__(self):
+        self.sent: list[dict] = []
+
+    async def send(self, *args, **kwargs):
+        self.sent.append(kwargs)
+
+
+class FakeResponse:
+    async def send_message(self, *args, **kwargs):
+        pass
+
+
+class FakeInteraction:
+    # Stands in for a deferred discord.Interaction. Replies are recorded instead of sent.
+    def __init__(self):
+        self.expires_at = discord.utils.utcnow() + datetime.timedelta(minutes=15)
+        self.followup = FakeFollowup()
+        self.response = FakeResponse()
+
+
+def make_chart(column_count: int, shade: int = 0, spacing_px: int = 160, height: int = 1000) -> bytes:
+    # Makes a chart image with every column filled with its own color, so a clip shows which columns (and which
+    # chart) it was cropped from. See get_column_color().
+    image = numpy.full((height, column_count * spacing_px, 3), 255, numpy.uint8)
+    for column in range(column_count):
+        image[:, column * spacing_px:(column + 1) * spacing_px] = get_column_color(column, shade)
+    return cv2.imencode(".png", image)[1].tobytes()
+
+
+def get_column_color(column: int, shade: int = 0) -> tuple[int, int, int]:
+    return column * 16 % 256, shade * 32 % 256, 128
+
+
+@pytest.fixture
+def song_data_folder(tmp_path, monkeypatch):
+    # Keeps everything the strategies write to the drive inside the test's own folder.
+    folder = f"{tmp_path}/"
+    monkeypatch.setattr(fncstrategy, "SONG_DATA_FOLDER", folder)
+    monkeypatch.setattr(threeicecreamstrategy, "SONG_DATA_FOLDER", folder)
+    return folder
+
+
+@pytest.fixture(scope="session")
+def render_service():
+    service = RenderService(max_workers=2)
+    yield service
+    service.shutdown()
@@ -0,0 +1,121 @@
+import asyncio
+import time
+from collections import Counter
+
+import cv2
+import numpy
+
+from bot.exts.cogs.threeicecream import create_strategy
+from bot.resources.fnc.ddr.threeicecreamstrategy import SONG_LIST
+from bot.resources.fnc.fncimage import release_image
+from bot.utils import asyncutils, fileutils, metricsutils
+from bot.utils.httputils import HttpResponse
+from tests.conftest import FakeInteraction, make_chart, get_column_color
+
+COLUMN_COUNT = 12
+DOWNLOAD_SECONDS = 0.5
+
+
+def get_measures() -> dict[int, int]:
+    # Every column of the fixture charts holds four bars.
+    return {column: column * 4 + 1 for column in range(COLUMN_COUNT)}
+
+
+def create_fake_strategy(render_service, counts: Counter, shades: dict[str, int]):
+    # The site and OCR are faked, everything else (decoding, cropping, encoding, the caches) is real. Every chart
+    # is downloaded as a fixture chart in its own shade.
+    strategy = create_strategy(render_service)
+
+    async def download_image(**kwargs) -> HttpResponse:
+        counts["downloads"] += 1
+        await asyncio.sleep(DOWNLOAD_SECONDS)
+        chart_filename = await strategy.map_chart_filename(song=kwargs["song"], difficulty=kwargs["difficulty"])
+        return HttpResponse(url=chart_filename, status=200, headers={"content-type": "image/png"},
+                            content=make_chart(COLUMN_COUNT, shades[chart_filename]))
+
+    async def get_measure_numbers_from_image(image, use_doubles_spacing):
+        counts["ocr"] += 1
+        return get_measures(), {column: 100 for column in range(COLUMN_COUNT)}
+
+    strategy.download_image = download_image
+    strategy.get_measure_numbers_from_image = get_measure_numbers_from_image
+    return strategy
+
+
+async def get_singles_difficulties(strategy, song) -> list[dict]:
+    return [x for x in (await strategy.map_ratings_to_dict(song.ratings)).values() if x["rating_index"] <= 4]
+
+
+async def wait_for_background_tasks():
+    while asyncutils.BACKGROUND_TASKS or fileutils.WRITE_BEHIND_TASKS:
+        await asyncio.wait(asyncutils.BACKGROUND_TASKS | fileutils.WRITE_BEHIND_TASKS)
+
+
+def get_reply_image(interaction: FakeInteraction) -> numpy.ndarray:
+    reply, = interaction.followup.sent
+    return cv2.imdecode(numpy.frombuffer(reply["file"].fp.getvalue(), numpy.uint8), cv2.IMREAD_COLOR)
+
+
+def assert_clip(image: numpy.ndarray, start_column: int, end_column: int, shade: int):
+    # The clip has to be exactly the columns of the bars, taken from the right chart.
+    assert image is not None
+    assert image.shape[1] == (end_column - start_column) * 160
+    for column in range(start_column, end_column):
+        assert tuple(image[0, (column - start_column) * 160]) == get_column_color(column, shade)
+
+
+def test_same_clip_requests_coalesce(song_data_folder, render_service):
+    async def run():
+        counts = Counter()
+        song = SONG_LIST[0]
+        shades: dict[str, int] = {}
+        strategy = create_fake_strategy(render_service, counts, shades)
+        difficulty = (await get_singles_difficulties(strategy, song))[0]
+        shades[await strategy.map_chart_filename(song=song, difficulty=difficulty)] = 1
+        calls = metricsutils.COUNTERS["ddr.clip_renders.calls"]
+        coalesced = metricsutils.COUNTERS["ddr.clip_renders.coalesced"]
+
+        interactions = [FakeInteraction() for _ in range(8)]
+        await asyncio.gather(*(strategy.execute_strategy(x, song=song.song_name, difficulty=difficulty,
+                                                         bar_clip="5-13") for x in interactions))
+        await wait_for_background_tasks()
+
+        # One download, one OCR and one render, shared by every request.
+        assert counts["downloads"] == 1
+        assert counts["ocr"] == 1
+        assert metricsutils.COUNTERS["ddr.clip_renders.calls"] - calls == len(interactions)
+        assert metricsutils.COUNTERS["ddr.clip_renders.coalesced"] - coalesced == len(interactions) - 1
+        # But every request still gets its own reply.
+        for interaction in interactions:
+            assert_clip(get_reply_image(interaction), 1, 3, 1)
+
+    asyncio.run(run())
+
+
+def test_different_charts_dont_block_each_other(song_data_folder, render_service):
+    async def run():
+        counts = Counter()
+        song = SONG_LIST[0]
+        shades: dict[str, int] = {}
+        strategy = create_fake_strategy(render_service, counts, shades)
+        difficulties = await get_singles_difficulties(strategy, song)
+        for shade, difficulty in enumerate(difficulties, start=1):
+            shades[await strategy.map_chart_filename(song=song, difficulty=difficulty)] = shade
+        # The workers are started up front, so their start up time isn't counted against the requests.
+        release_image(await strategy.decode_image(make_chart(1)))
+
+        interactions = [FakeInteraction() for _ in difficulties]
+        started = time.monotonic()
+        await asyncio.gather(*(strategy.execute_strategy(x, song=song.song_name, difficulty=difficulty, bar_clip="1-9")
+                               for x, difficulty in zip(interactions, difficulties)))
+        elapsed = time.monotonic() - started
+        await wait_for_background_tasks()
+
+        # Each chart is downloaded once, and the downloads overlap instead of waiting on each other.
+        assert counts["downloads"] == len(difficulties)
+        assert elapsed < DOWNLOAD_SECONDS * len(difficulties) * 0.75
+        # Every request gets the clip of its own chart.
+        for shade, interaction in enumerate(interactions, start=1):
+            assert_clip(get_reply_image(interaction), 0, 2, shade)
+
+    asyncio.run(run())
@@ -0,0 +1,45 @@
+import numpy
+import pytest
+
+from bot.resources.fnc.fncconstants import MEASURE_DEFAULT_STEP, MEASURE_INTERPOLATED_CONFIDENCE, \
+    MEASURE_EXTRAPOLATED_CONFIDENCE
+from bot.resources.fnc.fncmeasures import repair_measures
+
+TOLERANCE = 5
+READ_CONFIDENCE = 90
+
+
+def get_chart(column_count: int, step: int = 4) -> list[int]:
+    # The measures of a chart whose every column holds the same number of bars.
+    return [1 + step * column for column in range(column_count)]
+
+
+def with_reads(numbers: list[int], reads: dict[int, int]) -> list[int]:
+    return [reads.get(column, number) for column, number in enumerate(numbers)]
+
+
+# Each case is the raw reads of every column, the measures they should be repaired to, and the columns that should
+# be filled in rather than kept (with the confidence they should get). Every other read is kept with its confidence.
+CASES = {
+    "small misread of the last number": (
+        with_reads(get_chart(12), {11: 4}), get_chart(12), {11: MEASURE_EXTRAPOLATED_CONFIDENCE}),
+    "blank columns": (
+        with_reads(get_chart(12), {2: 0, 5: 0, 6: 0}), get_chart(12),
+        {2: MEASURE_INTERPOLATED_CONFIDENCE, 5: MEASURE_INTERPOLATED_CONFIDENCE, 6: MEASURE_INTERPOLATED_CONFIDENCE}),
+    "dropped digit mid-chart": (
+        with_reads(get_chart(40), {30: 12}), get_chart(40), {30: MEASURE_INTERPOLATED_CONFIDENCE}),
+    "all-zero chart": (
+        [0] * 8, get_chart(8, MEASURE_DEFAULT_STEP),
+        {column: MEASURE_EXTRAPOLATED_CONFIDENCE for column in range(1, 8)}),
+    "single-column chart": ([7], [1], {}),
+}
+
+
+@pytest.mark.parametrize("reads, expected, filled", CASES.values(), ids=CASES.keys())
+def test_repair_measures(reads: list[int], expected: list[int], filled: dict[int, float]):
+    numbers, confidences = repair_measures(numpy.array(reads), numpy.full(len(reads), READ_CONFIDENCE), TOLERANCE)
+
+    assert numbers.tolist() == expected
+    # Column 0 is always measure 1, and is always trusted.
+    expected_confidences = [100] + [filled.get(column, READ_CONFIDENCE) for column in range(1, len(reads))]
+    assert confidences.tolist() == expected_confidences
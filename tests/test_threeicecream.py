@@ -0,0 +1,118 @@
+import asyncio
+import glob
+import time
+
+import pytest
+from aiohttp import web
+
+from bot.exts.cogs.threeicecream import create_strategy
+from bot.resources.fnc.ddr import threeicecreamstrategy
+from bot.resources.fnc.ddr.threeicecreamstrategy import SONG_LIST
+from bot.resources.fnc.fncconstants import CHART_UPSTREAM_ERROR_TTL
+from bot.resources.fnc.fncstrategy import ChartUnavailableError
+from bot.utils.httputils import HttpError
+from tests.conftest import make_chart
+
+POLL_SECONDS = 0.5
+POLL_INTERVAL = 0.05
+ATTEMPTS = 3
+RETRY_BACKOFF = 0.1
+
+
+class StubSite:
+    def __init__(self, missing_polls: int):
+        # Stands in for 3icecream. The chart image 404s for the first missing_polls requests after its page has
+        # been visited, and is there after that. Every request is counted.
+        self.missing_polls = missing_polls
+        self.page_visits = 0
+        self.image_requests = 0
+        self.polls_since_visit = 0
+        self.chart = make_chart(12)
+
+    async def get_page(self, request: web.Request) -> web.Response:
+        self.page_visits += 1
+        self.polls_since_visit = 0
+        return web.Response(text="<html></html>", content_type="text/html")
+
+    async def get_image(self, request: web.Request) -> web.Response:
+        self.image_requests += 1
+        self.polls_since_visit += 1
+        if self.page_visits == 0 or self.polls_since_visit <= self.missing_polls:
+            return web.Response(status=404, text="Not Found")
+        return web.Response(body=self.chart, content_type="image/png")
+
+    async def start(self) -> web.AppRunner:
+        app = web.Application()
+        app.router.add_get("/ren/chart", self.get_page)
+        app.router.add_get("/img/charts/{name}", self.get_image)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", 0).start()
+        return runner
+
+
+@pytest.fixture
+def stub_timings(monkeypatch):
+    monkeypatch.setattr(threeicecreamstrategy, "THREEICECREAM_IMAGE_POLL_SECONDS", POLL_SECONDS)
+    monkeypatch.setattr(threeicecreamstrategy, "THREEICECREAM_IMAGE_POLL_INTERVAL", POLL_INTERVAL)
+    monkeypatch.setattr(threeicecreamstrategy, "THREEICECREAM_ATTEMPTS", ATTEMPTS)
+    monkeypatch.setattr(threeicecreamstrategy, "THREEICECREAM_RETRY_BACKOFF", RETRY_BACKOFF)
+
+
+async def download_from(site: StubSite, render_service, monkeypatch, fetch: str = "download_image"):
+    # Gets the first chart of the first song from the stub site with the strategy's fetch method. Returns the
+    # response (or the error raised instead), how long it took, and the strategy.
+    runner = await site.start()
+    host, port = runner.addresses[0][:2]
+    monkeypatch.setattr(threeicecreamstrategy, "THREEICECREAM_URL", f"http://{host}:{port}")
+    strategy = create_strategy(render_service)
+    song = SONG_LIST[0]
+    difficulty = next(iter((await strategy.map_ratings_to_dict(song.ratings)).values()))
+    started = time.monotonic()
+    try:
+        result = await getattr(strategy, fetch)(song=song, difficulty=difficulty)
+    except (ChartUnavailableError, HttpError) as e:
+        result = e
+    finally:
+        await strategy.http_client.close()
+        await runner.cleanup()
+    return result, time.monotonic() - started, strategy
+
+
+def test_image_is_polled_until_it_shows_up(song_data_folder, render_service, stub_timings, monkeypatch):
+    site = StubSite(missing_polls=4)
+    response, elapsed, _ = asyncio.run(download_from(site, render_service, monkeypatch))
+
+    # The page is only warmed once, and the image is asked for until it's there.
+    assert response.ok
+    assert response.content == site.chart
+    assert site.page_visits == 1
+    assert site.image_requests == 5
+    assert elapsed < POLL_SECONDS
+
+
+def test_polling_gives_up_at_the_deadline(song_data_folder, render_service, stub_timings, monkeypatch):
+    site = StubSite(missing_polls=10 ** 6)
+    error, elapsed, _ = asyncio.run(download_from(site, render_service, monkeypatch))
+
+    # Every attempt warms the page again and polls for the whole window, then it gives up like a timed out request.
+    assert isinstance(error, HttpError)
+    assert site.page_visits == ATTEMPTS
+    assert site.image_requests <= ATTEMPTS * (POLL_SECONDS / (POLL_INTERVAL * 0.5) + 1)
+    min_backoff = sum(RETRY_BACKOFF * 2 ** (attempt - 1) * 0.5 for attempt in range(1, ATTEMPTS))
+    max_backoff = sum(RETRY_BACKOFF * 2 ** (attempt - 1) * 1.5 for attempt in range(1, ATTEMPTS))
+    assert ATTEMPTS * POLL_SECONDS + min_backoff <= elapsed
+    assert elapsed < ATTEMPTS * (POLL_SECONDS + POLL_INTERVAL * 1.5) + max_backoff + 1
+
+
+def test_chart_that_never_shows_up_is_unavailable(song_data_folder, render_service, stub_timings, monkeypatch):
+    site = StubSite(missing_polls=10 ** 6)
+    error, _, strategy = asyncio.run(download_from(site, render_service, monkeypatch, fetch="get_decoded_image"))
+
+    # The request fails instead of hanging, and nothing is written to the drive. The site is asked again soon,
+    # since the image not showing up in time doesn't mean it never will.
+    assert isinstance(error, ChartUnavailableError)
+    assert site.page_visits == ATTEMPTS
+    (retry_at, _), = strategy.unavailable_charts.values()
+    assert retry_at - time.monotonic() <= CHART_UPSTREAM_ERROR_TTL
+    assert not glob.glob(f"{song_data_folder}**/*.png", recursive=True)